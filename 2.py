@@ -1,102 +1,609 @@
 import sys
 import math
-from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                              QHBoxLayout, QLabel, QSpinBox, QDoubleSpinBox, 
-                              QPushButton, QComboBox, QGroupBox, QCheckBox)
-from PySide6.QtGui import QPainter, QPen, QColor, QPolygon
-from PySide6.QtCore import Qt, QPointimport sys
-import math
+import os
+import time
+import json
+import argparse
+import collections
+import contextlib
+import threading
+import weakref
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QHBoxLayout, QLabel, QSpinBox, QDoubleSpinBox,
                                QPushButton, QComboBox, QGroupBox, QCheckBox,
                                QScrollArea, QTabWidget)
-from PySide6.QtGui import QPainter, QPen, QColor, QPolygon
-from PySide6.QtCore import Qt, QPoint
+from PySide6.QtGui import QPainter, QPen, QColor, QPolygon, QImage
+from PySide6.QtCore import Qt, QPoint, QLine, QRect, QTimer, QThread, Signal
+
+
+def pack_color(color, alpha=255):
+    # Пиксель в формате QImage.Format_ARGB32_Premultiplied
+    r, g, b = (int(c) * alpha // 255 for c in color[:3])
+    return (alpha << 24) | (r << 16) | (g << 8) | b
+
+
+def pack_colors(colors, alpha=255):
+    # То же для массива цветов (N, 3)
+    rgb = np.clip(colors, 0, 255).astype(np.uint32) * alpha // 255
+    return np.uint32(alpha << 24) | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+
+
+def _normalize(vectors):
+    lengths = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+    return vectors / np.where(lengths > 0, lengths, 1)[:, None]
+
+
+def light_colors(base, normals, positions, light):
+    # Ambient + diffuse (и specular, если задан) для массива точек, все массивы (N, 3).
+    # Расчёт идёт в типе позиций, чтобы float32 из G-буфера не расширялся до float64
+    dtype = positions.dtype
+    normals = _normalize(normals)
+    to_light = _normalize(light['position'].astype(dtype) - positions)
+    cos = np.einsum('ij,ij->i', normals, to_light)
+    colors = base * (float(light['ambient']) + float(light['diffuse']) * np.maximum(cos, 0))[:, None]
+    if light.get('specular'):
+        reflected = 2 * cos[:, None] * normals - to_light
+        to_eye = _normalize(light['eye'].astype(dtype) - positions)
+        highlight = np.maximum(np.einsum('ij,ij->i', reflected, to_eye), 0) ** light['shininess']
+        colors += 255 * float(light['specular']) * np.where(cos > 0, highlight, 0)[:, None]
+    return np.minimum(colors, 255)
+
+
+def shade_fragments(values, shader):
+    # values - атрибуты вершин, интерполированные в пиксели:
+    # gouraud - цвет (3), phong - нормаль, мировая позиция и базовый цвет (9)
+    if shader['method'] == 'phong':
+        colors = light_colors(values[:, 6:9], values[:, 0:3], values[:, 3:6], shader['light'])
+    else:
+        colors = values[:, :3]
+    return pack_colors(colors, shader['alpha'])
+
+
+# Пикселей в одной полосе растеризации: временные массивы треугольника
+# ограничены этим размером, а не площадью его ограничивающего прямоугольника
+RASTER_BAND_PIXELS = 1 << 16
+
+
+def triangle_coverage(xy, z, clip):
+    # Рёберные функции задаются один раз на треугольник и вычисляются массивом
+    # по ограничивающему прямоугольнику полосами строк. Для каждой полосы выдаётся
+    # (y0, x0, inside, weights, depth); покрытие считается во float64 по абсолютным
+    # координатам пикселя, поэтому не зависит от разбиения на полосы и тайлы,
+    # а веса и глубина для дальнейшей работы переводятся во float32
+    xy = np.asarray(xy, dtype=float)
+    a, b = xy, np.roll(xy, -1, axis=0)
+    edge_a = a[:, 1] - b[:, 1]
+    edge_b = b[:, 0] - a[:, 0]
+    edge_c = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+    area = edge_c.sum()
+    if abs(area) < 1e-9:
+        return
+
+    min_x = max(clip[0], int(math.ceil(xy[:, 0].min())))
+    max_x = min(clip[2] - 1, int(math.floor(xy[:, 0].max())))
+    min_y = max(clip[1], int(math.ceil(xy[:, 1].min())))
+    max_y = min(clip[3] - 1, int(math.floor(xy[:, 1].max())))
+    if min_x > max_x or min_y > max_y:
+        return
+
+    px = np.arange(min_x, max_x + 1, dtype=float)
+    z = np.asarray(z, dtype=np.float32)
+    rows = max(1, RASTER_BAND_PIXELS // len(px))
+    for top in range(min_y, max_y + 1, rows):
+        py = np.arange(top, min(top + rows, max_y + 1), dtype=float)
+        # Функция ребра (i, i+1) даёт барицентрическую координату вершины i+2
+        edges = (edge_a[:, None, None] * px[None, None, :] + edge_b[:, None, None] * py[None, :, None]
+                 + edge_c[:, None, None]) / area
+        inside = (edges >= -1e-9).all(axis=0)
+        if not inside.any():
+            continue
+        weights = np.roll(edges, 2, axis=0).astype(np.float32)
+        yield top, min_x, inside, weights, np.tensordot(z, weights, axes=1)
+
+
+def rasterize_triangle(z_buffer, color_buffer, xy, z, packed, clip=None, attributes=None, shader=None,
+                       gbuffer=None):
+    if clip is None:
+        clip = (0, 0, z_buffer.shape[1], z_buffer.shape[0])
+    written = 0
+    for y0, x0, inside, weights, depth in triangle_coverage(xy, z, clip):
+        h, w = inside.shape
+        z_window = z_buffer[y0:y0 + h, x0:x0 + w]
+        mask = inside & (depth < z_window)
+        z_window[mask] = depth[mask]
+        if gbuffer is not None:
+            # Отложенное освещение: в G-буфер пишутся нормаль и базовый цвет, ненулевой цвет
+            # отмечает освещаемый пиксель; позицию потом восстанавливает z-буфер
+            normals, bases = gbuffer
+            normals[y0:y0 + h, x0:x0 + w][mask] = weights[:, mask].T @ attributes
+            bases[y0:y0 + h, x0:x0 + w][mask] = packed
+        elif attributes is not None and attributes.shape[1]:
+            # Атрибуты вершин (3, K) интерполируются барицентрическими весами
+            values = weights[:, mask].T @ attributes
+            color_buffer[y0:y0 + h, x0:x0 + w][mask] = shade_fragments(values, shader)
+        else:
+            color_buffer[y0:y0 + h, x0:x0 + w][mask] = packed
+        written += int(np.count_nonzero(mask))
+    return written
+
+
+def clip_lines(line_xy, clip):
+    # Отсечение Лианга-Барски сразу для всех отрезков: возвращает диапазон
+    # параметра [t0, t1] внутри пикселей clip (пустой, если t0 > t1)
+    start = line_xy[:, 0]
+    delta = line_xy[:, 1] - start
+    t0 = np.zeros(len(line_xy))
+    t1 = np.ones(len(line_xy))
+    for axis, low, high in ((0, clip[0] - 0.5, clip[2] - 0.5), (1, clip[1] - 0.5, clip[3] - 0.5)):
+        d = delta[:, axis]
+        p = start[:, axis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ta = (low - p) / d
+            tb = (high - p) / d
+        parallel = d == 0
+        inside = (p >= low) & (p <= high)
+        t0 = np.maximum(t0, np.where(parallel, np.where(inside, -np.inf, np.inf), np.minimum(ta, tb)))
+        t1 = np.minimum(t1, np.where(parallel, np.where(inside, np.inf, -np.inf), np.maximum(ta, tb)))
+    return t0, t1
+
+
+def rasterize_lines(z_buffer, color_buffer, line_xy, line_z, line_colors, clip, gbuffer=None):
+    if len(line_colors) == 0:
+        return 0
+    start = line_xy[:, 0]
+    delta = line_xy[:, 1] - start
+
+    # Отрезок делится на max(|dx|, |dy|) шагов; после отсечения остаются только
+    # шаги внутри clip, поэтому тайлы дают те же пиксели, что и целый кадр
+    steps = np.rint(np.abs(delta).max(axis=1)).astype(np.int64)
+    t0, t1 = clip_lines(line_xy, clip)
+    first = np.ceil(t0 * steps)
+    last = np.floor(t1 * steps)
+    counts = np.where(t0 <= t1, np.maximum(last - first + 1, 0), 0).astype(np.int64)
+    if counts.sum() == 0:
+        return 0
+
+    segment = np.repeat(np.arange(len(counts)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    t = (first[segment] + local) / np.maximum(steps, 1)[segment]
+
+    xs = np.floor(start[segment, 0] + t * delta[segment, 0] + 0.5).astype(np.int64)
+    ys = np.floor(start[segment, 1] + t * delta[segment, 1] + 0.5).astype(np.int64)
+    zs = (line_z[segment, 0] + t * (line_z[segment, 1] - line_z[segment, 0])).astype(z_buffer.dtype)
+    inside = (xs >= clip[0]) & (xs < clip[2]) & (ys >= clip[1]) & (ys < clip[3])
+    pixels = ys[inside] * z_buffer.shape[1] + xs[inside]
+    zs = zs[inside]
+    segment = segment[inside]
+
+    # Глубина сводится к минимуму по пикселю; цвет пишут фрагменты, оказавшиеся ближайшими
+    z_flat = z_buffer.reshape(-1)
+    np.minimum.at(z_flat, pixels, zs)
+    passed = zs <= z_flat[pixels]
+    color_buffer.reshape(-1)[pixels[passed]] = line_colors[segment[passed]]
+    if gbuffer is not None:
+        gbuffer[1].reshape(-1)[pixels[passed]] = 0
+    return int(np.count_nonzero(passed))
+
+
+def rasterize_primitives(z_buffer, color_buffer, triangles, lines, clip=None, shader=None, gbuffer=None):
+    # triangles: (xy (T,3,2), z (T,3), цвета (T,), атрибуты (T,3,K)), lines: (xy (L,2,2), z (L,2), цвета (L,)).
+    # При K > 0 цвет пикселя считает shade_fragments по словарю shader, а с gbuffer
+    # (нормали (H,W,3), базовые цвета (H,W)) нормали и цвета только записываются для последующего освещения
+    if clip is None:
+        clip = (0, 0, z_buffer.shape[1], z_buffer.shape[0])
+
+    # Возвращает число записанных пикселей
+    written = 0
+    tri_xy, tri_z, tri_colors, tri_attributes = triangles
+    # Атрибуты интерполируются и освещаются во float32, как и веса полос
+    tri_attributes = np.asarray(tri_attributes, dtype=np.float32)
+    for i in range(len(tri_colors)):
+        written += rasterize_triangle(z_buffer, color_buffer, tri_xy[i], tri_z[i], tri_colors[i], clip,
+                                      tri_attributes[i], shader, gbuffer)
+
+    return written + rasterize_lines(z_buffer, color_buffer, *lines, clip, gbuffer)
+
+
+_tile_buffers = {}
+
+
+def _attach_tile_buffers(names, shape):
+    # Рабочий процесс подключается к разделяемым буферам один раз на их размер
+    if _tile_buffers.get('names') != names:
+        for segment in _tile_buffers.get('segments', ()):
+            segment.close()
+        # Рабочие процессы пула делят трекер ресурсов с главным: регистрация при
+        # подключении совпадает с его собственной и снимается, когда он удаляет буферы
+        segments = [shared_memory.SharedMemory(name=name) for name in names]
+        _tile_buffers.update(
+            names=names,
+            segments=segments,
+            z_buffer=np.ndarray(shape, dtype=np.float32, buffer=segments[0].buf),
+            color_buffer=np.ndarray(shape, dtype=np.uint32, buffer=segments[1].buf),
+        )
+    return _tile_buffers['z_buffer'], _tile_buffers['color_buffer']
+
+
+def _rasterize_tile(task):
+    names, shape, clip, triangles, lines, shader = task
+    z_buffer, color_buffer = _attach_tile_buffers(names, shape)
+    return rasterize_primitives(z_buffer, color_buffer, triangles, lines, clip, shader)
+
+
+class TileRasterizer:
+    def __init__(self, workers, tile_size=128):
+        self.workers = workers
+        self.tile_size = tile_size
+        # Без fork: пул создаётся после запуска Qt и, в фоновом режиме, из потока рендера
+        self.pool = multiprocessing.get_context('spawn').Pool(workers)
+        self.shape = None
+        self.z_buffer = None
+        self.color_buffer = None
+        self.pixels_written = 0
+        self._segments = []
+
+    def resize(self, width, height):
+        if self.shape == (height, width):
+            return
+        self._release_buffers()
+        size = max(1, width * height * 4)
+        self._segments = [shared_memory.SharedMemory(create=True, size=size) for _ in range(2)]
+        self.shape = (height, width)
+        self.z_buffer = np.ndarray(self.shape, dtype=np.float32, buffer=self._segments[0].buf)
+        self.color_buffer = np.ndarray(self.shape, dtype=np.uint32, buffer=self._segments[1].buf)
+
+    def bin_primitives(self, triangles, lines, shader=None):
+        height, width = self.shape
+        names = tuple(segment.name for segment in self._segments)
+        tri_xy, tri_z, tri_colors, tri_attributes = triangles
+        line_xy, line_z, line_colors = lines
+        tri_min, tri_max = tri_xy.min(axis=1, initial=np.inf), tri_xy.max(axis=1, initial=-np.inf)
+        line_min, line_max = line_xy.min(axis=1, initial=np.inf), line_xy.max(axis=1, initial=-np.inf)
+
+        tasks = []
+        for ty in range(0, height, self.tile_size):
+            for tx in range(0, width, self.tile_size):
+                clip = (tx, ty, min(tx + self.tile_size, width), min(ty + self.tile_size, height))
+                tri_mask = ((tri_max[:, 0] >= clip[0]) & (tri_min[:, 0] < clip[2]) &
+                            (tri_max[:, 1] >= clip[1]) & (tri_min[:, 1] < clip[3]))
+                # Точки отрезков округляются до ближайшего пикселя, поэтому отрезок
+                # на полпикселя левее или выше тайла ещё может в него попасть
+                line_mask = ((line_max[:, 0] >= clip[0] - 1) & (line_min[:, 0] < clip[2] + 1) &
+                             (line_max[:, 1] >= clip[1] - 1) & (line_min[:, 1] < clip[3] + 1))
+                if not tri_mask.any() and not line_mask.any():
+                    continue
+                tasks.append((
+                    names, self.shape, clip,
+                    (tri_xy[tri_mask], tri_z[tri_mask], tri_colors[tri_mask], tri_attributes[tri_mask]),
+                    (line_xy[line_mask], line_z[line_mask], line_colors[line_mask]),
+                    shader,
+                ))
+        return tasks
+
+    def render(self, triangles, lines, width, height, shader=None):
+        self.resize(width, height)
+        self.z_buffer.fill(np.inf)
+        self.color_buffer.fill(0)
+        self.pixels_written = sum(self.pool.map(_rasterize_tile, self.bin_primitives(triangles, lines, shader),
+                                                  chunksize=1))
+        return self.z_buffer, self.color_buffer
+
+    def _release_buffers(self):
+        self.z_buffer = None
+        self.color_buffer = None
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+        self.shape = None
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        self._release_buffers()
+
+
+class FramebufferPool:
+    # Постоянные буферы кадра по имени: память выделяется только при смене размера,
+    # а перед каждым кадром буферы очищаются на месте
+    def __init__(self):
+        self.buffers = {}
+        self.allocations = 0
+
+    def get(self, name, shape, dtype):
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buffer
+            self.allocations += 1
+        return buffer
+
+    def frame(self, width, height, prefix=''):
+        # Глубина +inf и прозрачный цвет: пустой кадр для растеризации
+        z_buffer = self.get(prefix + 'depth', (height, width), np.float32)
+        color_buffer = self.get(prefix + 'color', (height, width), np.uint32)
+        z_buffer.fill(np.inf)
+        color_buffer.fill(0)
+        return z_buffer, color_buffer
+
+    def resize(self, width, height):
+        # Основные буферы создаются заранее; G-буфер и буферы превью - при первом кадре
+        self.get('depth', (height, width), np.float32)
+        self.get('color', (height, width), np.uint32)
+
+
+class Mesh:
+    def __init__(self, vertices, edges, face_offsets, face_indices, face_normals):
+        self.vertices = vertices
+        self.edges = edges
+        self.face_offsets = face_offsets
+        self.face_indices = face_indices
+        # Единичные нормали и центры граней считаются один раз при построении
+        self.face_normals = _normalize(face_normals)
+
+        # Ограничивающие параллелепипед и сфера в координатах меша
+        if len(vertices):
+            self.box_min = vertices.min(axis=0)
+            self.box_max = vertices.max(axis=0)
+        else:
+            self.box_min = self.box_max = np.zeros(3)
+        self.sphere_center = (self.box_min + self.box_max) / 2
+        self.sphere_radius = float(np.linalg.norm(vertices - self.sphere_center, axis=1).max()) if len(vertices) else 0.0
+
+        self.face_sizes = np.diff(face_offsets)
+        if self.face_count and len(face_indices):
+            self.face_centroids = (np.add.reduceat(vertices[face_indices], face_offsets[:-1])
+                                   / self.face_sizes[:, None])
+        else:
+            self.face_centroids = np.zeros((self.face_count, 3))
+
+        # Нормали вершин - среднее нормалей прилегающих граней
+        vertex_normals = np.zeros_like(vertices)
+        np.add.at(vertex_normals, face_indices, np.repeat(self.face_normals, self.face_sizes, axis=0))
+        self.vertex_normals = _normalize(vertex_normals)
+
+        # Веер треугольников каждой грани и номер грани для каждого треугольника
+        triangles, triangle_faces = [], []
+        for face in range(self.face_count):
+            indices = self.face(face)
+            for i in range(1, len(indices) - 1):
+                triangles.append((indices[0], indices[i], indices[i + 1]))
+                triangle_faces.append(face)
+        self.triangles = np.array(triangles, dtype=np.int32).reshape(-1, 3)
+        self.triangle_faces = np.array(triangle_faces, dtype=np.int32)
+
+    @property
+    def face_count(self):
+        return len(self.face_offsets) - 1
+
+    def face(self, index):
+        return self.face_indices[self.face_offsets[index]:self.face_offsets[index + 1]]
+
+
+class MeshBuilder:
+    def __init__(self):
+        self.vertices = []
+        self.edges = []
+        self.face_offsets = [0]
+        self.face_indices = []
+        self.face_normals = []
+        self._vertex_index = {}
+        self._edge_set = set()
+
+    def add_vertex(self, vertex):
+        # Совпадающие вершины сливаются в одну
+        key = tuple(round(float(c), 9) for c in vertex)
+        index = self._vertex_index.get(key)
+        if index is None:
+            index = len(self.vertices)
+            self._vertex_index[key] = index
+            self.vertices.append(key)
+        return index
+
+    def add_vertices(self, vertices):
+        return [self.add_vertex(v) for v in vertices]
+
+    def add_edge(self, v1, v2):
+        if v1 == v2:
+            return
+        edge = (min(v1, v2), max(v1, v2))
+        if edge not in self._edge_set:
+            self._edge_set.add(edge)
+            self.edges.append(edge)
+
+    def add_path(self, indices, closed=False):
+        for i in range(len(indices) - 1):
+            self.add_edge(indices[i], indices[i + 1])
+        if closed:
+            self.add_edge(indices[-1], indices[0])
+
+    def add_face(self, indices, normal):
+        self.face_indices.extend(indices)
+        self.face_offsets.append(len(self.face_indices))
+        self.face_normals.append(normal)
+
+    def build(self):
+        return Mesh(
+            np.array(self.vertices, dtype=float).reshape(-1, 3),
+            np.array(self.edges, dtype=np.int32).reshape(-1, 2),
+            np.array(self.face_offsets, dtype=np.int32),
+            np.array(self.face_indices, dtype=np.int32),
+            np.array(self.face_normals, dtype=float).reshape(-1, 3),
+        )
+
+
+# Общие меши: экземпляры букв с одинаковыми размерами ссылаются на один меш
+# и хранят только свою трансформацию; меш без букв удаляется из кэша сам
+_mesh_cache = weakref.WeakValueDictionary()
 
 
 class Letter3D:
-    def __init__(self, letter, height=4, width=2, depth=1):
+    def __init__(self, letter, height=4, width=2, depth=1, segments=12):
         self.letter = letter
         self.height = height
         self.width = width
         self.depth = depth
+        self.segments = segments
         self.position = [0, 0, 0]
         self.rotation = [0, 0, 0]
         self.scale = [1, 1, 1]
         self.reflection = [1, 1, 1]
-        self.vertices = []
-        self.transformed_vertices = []
-        self.edges = []
-        self.faces = []
-        self.center_point = [0, 0, 0]
-        self.transformed_center_point = [0, 0, 0]
+        self.mesh = None
+        self.vertices = np.zeros((0, 3))
+        self.edges = np.zeros((0, 2), dtype=np.int32)
+        self.center_point = np.zeros(3)
         self.show_center = True
+
+        # Меш перестраивается только при смене размеров, трансформации лишь
+        # увеличивают версию, а мировые координаты пересчитываются лениво
+        self._mesh_key = None
+        self.transform_version = 0
+        self._matrix = None
+        self._matrix_version = -1
+        self._bounds = None
+        self._bounds_version = -1
+        self._faces = None
+        self._faces_version = -1
+        self._vertex_normals = np.zeros((0, 3))
+        self._vertex_normals_version = -1
+        self._world_version = -1
+        self._transformed_vertices = np.zeros((0, 3))
         self.update_geometry()
 
-    def transform_vertex(self, vertex):
-        transformed = [
-            vertex[0] * self.scale[0] * self.reflection[0],
-            vertex[1] * self.scale[1] * self.reflection[1],
-            vertex[2] * self.scale[2] * self.reflection[2]
-        ]
+    def model_matrix(self):
+        if self._matrix_version != self.transform_version:
+            self._matrix = self._build_model_matrix()
+            self._matrix_version = self.transform_version
+        return self._matrix
+
+    def _build_model_matrix(self):
+        ax, ay, az = (math.radians(angle) for angle in self.rotation)
+        rot_x = np.array([[1, 0, 0],
+                          [0, math.cos(ax), -math.sin(ax)],
+                          [0, math.sin(ax), math.cos(ax)]])
+        rot_y = np.array([[math.cos(ay), 0, math.sin(ay)],
+                          [0, 1, 0],
+                          [-math.sin(ay), 0, math.cos(ay)]])
+        rot_z = np.array([[math.cos(az), -math.sin(az), 0],
+                          [math.sin(az), math.cos(az), 0],
+                          [0, 0, 1]])
+
+        # Масштаб и отражение, затем повороты X -> Y -> Z, затем перенос
+        matrix = np.identity(4)
+        matrix[:3, :3] = rot_z @ rot_y @ rot_x @ np.diag(np.multiply(self.scale, self.reflection))
+        matrix[:3, 3] = self.position
+        return matrix
+
+    def world_bounds(self):
+        # Сфера (центр, радиус) и AABB (min, max) в мировых координатах, пересчитываются с трансформацией
+        if self._bounds_version != self.transform_version:
+            matrix = self.model_matrix()
+            linear, offset = matrix[:3, :3], matrix[:3, 3]
+            mesh = self.mesh
+            if mesh is None:
+                self._bounds = (offset.copy(), 0.0, offset.copy(), offset.copy())
+            else:
+                center = linear @ mesh.sphere_center + offset
+                radius = mesh.sphere_radius * np.linalg.norm(linear, axis=0).max()
+                box_center = linear @ ((mesh.box_min + mesh.box_max) / 2) + offset
+                half = np.abs(linear) @ ((mesh.box_max - mesh.box_min) / 2)
+                self._bounds = (center, radius, box_center - half, box_center + half)
+            self._bounds_version = self.transform_version
+        return self._bounds
+
+    def world_faces(self):
+        # Центры и единичные нормали граней в мировых координатах, общие для
+        # отсечения, сортировки и освещения; пересчитываются с трансформацией
+        if self._faces_version != self.transform_version:
+            if self.mesh is None:
+                self._faces = (np.zeros((0, 3)), np.zeros((0, 3)))
+            else:
+                matrix = self.model_matrix()
+                linear = matrix[:3, :3]
+                centroids = self.mesh.face_centroids @ linear.T + matrix[:3, 3]
+                # Нормали переносятся обратной транспонированной матрицей, чтобы
+                # неравномерный масштаб и отражение не портили их направление
+                normals = _normalize(self.mesh.face_normals @ np.linalg.pinv(linear))
+                self._faces = (centroids, normals)
+            self._faces_version = self.transform_version
+        return self._faces
+
+    def world_vertex_normals(self):
+        if self._vertex_normals_version != self.transform_version:
+            if self.mesh is not None:
+                self._vertex_normals = _normalize(self.mesh.vertex_normals @ np.linalg.pinv(self.model_matrix()[:3, :3]))
+            self._vertex_normals_version = self.transform_version
+        return self._vertex_normals
+
+    def transform_points(self, points):
+        matrix = self.model_matrix()
+        return np.asarray(points, dtype=float) @ matrix[:3, :3].T + matrix[:3, 3]
 
-        angle_x = math.radians(self.rotation[0])
-        y = transformed[1] * math.cos(angle_x) - transformed[2] * math.sin(angle_x)
-        z = transformed[1] * math.sin(angle_x) + transformed[2] * math.cos(angle_x)
-        transformed = [transformed[0], y, z]
-
-        angle_y = math.radians(self.rotation[1])
-        x = transformed[0] * math.cos(angle_y) + transformed[2] * math.sin(angle_y)
-        z = -transformed[0] * math.sin(angle_y) + transformed[2] * math.cos(angle_y)
-        transformed = [x, transformed[1], z]
-
-        angle_z = math.radians(self.rotation[2])
-        x = transformed[0] * math.cos(angle_z) - transformed[1] * math.sin(angle_z)
-        y = transformed[0] * math.sin(angle_z) + transformed[1] * math.cos(angle_z)
-        transformed = [x, y, transformed[2]]
-
-        return [
-            transformed[0] + self.position[0],
-            transformed[1] + self.position[1],
-            transformed[2] + self.position[2]
-        ]
+    def transform_vertex(self, vertex):
+        return self.transform_points([vertex])[0]
 
     def update_geometry(self):
-        if self.letter == 'С':
-            self.create_letter_c()
-        elif self.letter == 'Д':
-            self.create_letter_de()
+        mesh_key = (self.letter, self.height, self.width, self.depth, self.segments)
+        if mesh_key != self._mesh_key:
+            mesh = _mesh_cache.get(mesh_key)
+            if mesh is not None:
+                self.set_mesh(mesh)
+            else:
+                if self.letter == 'С':
+                    self.create_letter_c()
+                elif self.letter == 'Д':
+                    self.create_letter_de()
+                if self.mesh is not None:
+                    _mesh_cache[mesh_key] = self.mesh
+            self.calculate_center_point()
+            self._mesh_key = mesh_key
+        self.mark_transform_dirty()
+
+    def mark_transform_dirty(self):
+        self.transform_version += 1
+
+    def _update_world_cache(self):
+        if self._world_version == self.transform_version:
+            return
+        self._transformed_vertices = self.transform_points(self.vertices)
+        self._world_version = self.transform_version
+
+    @property
+    def transformed_vertices(self):
+        self._update_world_cache()
+        return self._transformed_vertices
 
-        self.calculate_center_point()
-        self.transformed_vertices = [self.transform_vertex(v) for v in self.vertices]
-        self.transformed_center_point = self.transform_vertex(self.center_point)
+    @property
+    def transformed_center_point(self):
+        matrix = self.model_matrix()
+        return matrix[:3, :3] @ self.center_point + matrix[:3, 3]
+
+    def set_mesh(self, mesh):
+        self.mesh = mesh
+        self.vertices = mesh.vertices
+        self.edges = mesh.edges
 
     def calculate_center_point(self):
         # Геометрический центр всех вершин
-        if not self.vertices:
-            self.center_point = [0, 0, 0]
+        if len(self.vertices) == 0:
+            self.center_point = np.zeros(3)
             return
-        n = len(self.vertices)
-        cx = sum(v[0] for v in self.vertices) / n
-        cy = sum(v[1] for v in self.vertices) / n
-        cz = sum(v[2] for v in self.vertices) / n
-        self.center_point = [cx, cy, cz]
+        self.center_point = self.vertices.mean(axis=0)
 
     def toggle_center_point(self):
         self.show_center = not self.show_center
         return self.show_center
 
     def create_letter_c(self):
-        self.vertices = []
-        self.edges = []
-        self.faces = []
-
         h = self.height
         w = self.width
         d = self.depth
         t = w * 0.15
 
-        segments = 12
+        segments = self.segments
 
         front_outer = []
         for i in range(segments + 1):
@@ -115,60 +622,41 @@ class Letter3D:
         back_outer = [[v[0], v[1], v[2] + d] for v in front_outer]
         back_inner = [[v[0], v[1], v[2] + d] for v in front_inner]
 
-        self.vertices = front_outer + front_inner + back_outer + back_inner
-
-        def add_edge(v1, v2):
-            edge = (min(v1, v2), max(v1, v2))
-            if edge not in self.edges:
-                self.edges.append(edge)
-
-        for i in range(len(front_outer) - 1):
-            add_edge(i, i + 1)
+        builder = MeshBuilder()
+        fo = builder.add_vertices(front_outer)
+        fi = builder.add_vertices(front_inner)
+        bo = builder.add_vertices(back_outer)
+        bi = builder.add_vertices(back_inner)
 
-        inner_offset = len(front_outer)
-        for i in range(len(front_inner) - 1):
-            add_edge(inner_offset + i, inner_offset + i + 1)
+        for contour in (fo, fi, bo, bi):
+            builder.add_path(contour)
 
-        back_offset = inner_offset + len(front_inner)
-        for i in range(len(back_outer) - 1):
-            add_edge(back_offset + i, back_offset + i + 1)
+        builder.add_edge(fo[0], bo[0])
+        builder.add_edge(fo[-1], bo[-1])
+        builder.add_edge(fi[0], bi[0])
+        builder.add_edge(fi[-1], bi[-1])
 
-        back_inner_offset = back_offset + len(back_outer)
-        for i in range(len(back_inner) - 1):
-            add_edge(back_inner_offset + i, back_inner_offset + i + 1)
+        builder.add_edge(fo[0], fi[0])
+        builder.add_edge(fo[-1], fi[-1])
+        builder.add_edge(bo[0], bi[0])
+        builder.add_edge(bo[-1], bi[-1])
 
-        add_edge(0, back_offset)
-        add_edge(len(front_outer) - 1, back_offset + len(back_outer) - 1)
-        add_edge(inner_offset, back_inner_offset)
-        add_edge(inner_offset + len(front_inner) - 1, back_inner_offset + len(back_inner) - 1)
+        for i in range(segments + 1):
+            builder.add_edge(fo[i], fi[i])
+            builder.add_edge(bo[i], bi[i])
+            builder.add_edge(fo[i], bo[i])
+            builder.add_edge(fi[i], bi[i])
 
-        add_edge(0, inner_offset)
-        add_edge(len(front_outer) - 1, inner_offset + len(front_inner) - 1)
-        add_edge(back_offset, back_inner_offset)
-        add_edge(back_offset + len(back_outer) - 1, back_inner_offset + len(back_inner) - 1)
+        builder.add_face(fo, [0, 0, -1])
+        builder.add_face(fi, [0, 0, 1])
+        builder.add_face(bo[::-1], [0, 0, 1])
+        builder.add_face(bi[::-1], [0, 0, -1])
+        builder.add_face([fo[0], fi[0], bi[0], bo[0]], [0, 1, 0])
+        builder.add_face([fo[-1], fi[-1], bi[-1], bo[-1]], [0, -1, 0])
 
-        for i in range(segments + 1):
-            add_edge(i, inner_offset + i)
-            add_edge(back_offset + i, back_inner_offset + i)
-            add_edge(i, back_offset + i)
-            add_edge(inner_offset + i, back_inner_offset + i)
-
-        self.faces = [
-            {'vertices': front_outer, 'normal': [0, 0, -1]},
-            {'vertices': front_inner, 'normal': [0, 0, 1]},
-            {'vertices': [v for v in reversed(back_outer)], 'normal': [0, 0, 1]},
-            {'vertices': [v for v in reversed(back_inner)], 'normal': [0, 0, -1]},
-            {'vertices': [front_outer[0], front_inner[0], back_inner[0], back_outer[0]],
-             'normal': [0, 1, 0]},
-            {'vertices': [front_outer[-1], front_inner[-1], back_inner[-1], back_outer[-1]],
-             'normal': [0, -1, 0]},
-        ]
+        self.set_mesh(builder.build())
 
     def create_letter_de(self):
-        self.vertices = []
-        self.edges = []
-        self.faces = []
-
         h = self.height
         w = self.width
         d = self.depth
@@ -205,58 +693,30 @@ class Letter3D:
         back_roof = [[v[0], v[1], v[2] + d] for v in front_roof]
         back_inner = [[v[0], v[1], v[2] + d] for v in front_inner]
 
-        self.vertices = front_outer + front_roof + front_inner + back_outer + back_roof + back_inner
-
-        def add_edge(v1_idx, v2_idx):
-            edge = (min(v1_idx, v2_idx), max(v1_idx, v2_idx))
-            if edge not in self.edges:
-                self.edges.append(edge)
-
-        for i in range(len(front_outer)):
-            add_edge(i, (i + 1) % len(front_outer))
-
-        roof_offset = len(front_outer)
-        for i in range(len(front_roof)):
-            add_edge(roof_offset + i, roof_offset + (i + 1) % len(front_roof))
-
-        inner_offset = roof_offset + len(front_roof)
-        for i in range(len(front_inner)):
-            add_edge(inner_offset + i, inner_offset + (i + 1) % len(front_inner))
-
-        back_offset = inner_offset + len(front_inner)
-        for i in range(len(back_outer)):
-            add_edge(back_offset + i, back_offset + (i + 1) % len(back_outer))
-
-        back_roof_offset = back_offset + len(back_outer)
-        for i in range(len(back_roof)):
-            add_edge(back_roof_offset + i, back_roof_offset + (i + 1) % len(back_roof))
+        # Углы крыши совпадают с верхом стенок и сливаются с ними в одну вершину
+        builder = MeshBuilder()
+        fo = builder.add_vertices(front_outer)
+        fr = builder.add_vertices(front_roof)
+        fi = builder.add_vertices(front_inner)
+        bo = builder.add_vertices(back_outer)
+        br = builder.add_vertices(back_roof)
+        bi = builder.add_vertices(back_inner)
 
-        back_inner_offset = back_roof_offset + len(back_roof)
-        for i in range(len(back_inner)):
-            add_edge(back_inner_offset + i, back_inner_offset + (i + 1) % len(back_inner))
+        for contour in (fo, fr, fi, bo, br, bi):
+            builder.add_path(contour, closed=True)
 
-        for i in range(len(front_outer)):
-            add_edge(i, back_offset + i)
+        for front, back in ((fo, bo), (fr, br), (fi, bi)):
+            for v1, v2 in zip(front, back):
+                builder.add_edge(v1, v2)
 
-        for i in range(len(front_roof)):
-            add_edge(roof_offset + i, back_roof_offset + i)
+        builder.add_face(fo, [0, 0, -1])
+        builder.add_face(fr, [0, 0, -1])
+        builder.add_face(fi, [0, 0, 1])
+        builder.add_face(bo, [0, 0, 1])
+        builder.add_face(br, [0, 0, 1])
+        builder.add_face(bi, [0, 0, -1])
 
-        for i in range(len(front_inner)):
-            add_edge(inner_offset + i, back_inner_offset + i)
-
-        add_edge(5, roof_offset)
-        add_edge(4, roof_offset + 1)
-        add_edge(back_offset + 5, back_roof_offset)
-        add_edge(back_offset + 4, back_roof_offset + 1)
-
-        self.faces = [
-            {'vertices': front_outer, 'normal': [0, 0, -1]},
-            {'vertices': front_roof, 'normal': [0, 0, -1]},
-            {'vertices': front_inner, 'normal': [0, 0, 1]},
-            {'vertices': back_outer, 'normal': [0, 0, 1]},
-            {'vertices': back_roof, 'normal': [0, 0, 1]},
-            {'vertices': back_inner, 'normal': [0, 0, -1]},
-        ]
+        self.set_mesh(builder.build())
 
     def reflect(self, axis):
         if axis == 'x':
@@ -265,7 +725,7 @@ class Letter3D:
             self.reflection[1] = -self.reflection[1]
         elif axis == 'z':
             self.reflection[2] = -self.reflection[2]
-        self.update_geometry()
+        self.mark_transform_dirty()
 
     def rotate(self, axis, angle):
         if axis == 'x':
@@ -274,7 +734,7 @@ class Letter3D:
             self.rotation[1] += angle
         elif axis == 'z':
             self.rotation[2] += angle
-        self.update_geometry()
+        self.mark_transform_dirty()
 
     def scale_object(self, axis, factor):
         if axis == 'x':
@@ -283,496 +743,1216 @@ class Letter3D:
             self.scale[1] *= factor
         elif axis == 'z':
             self.scale[2] *= factor
-        self.update_geometry()
+        self.mark_transform_dirty()
 
     def set_uniform_scale(self, scale):
         self.scale = [scale, scale, scale]
-        self.update_geometry()
-
-
-class ViewerWidget(QWidget):
-    def __init__(self, parent=None):
-        super().__init__(parent)
+        self.mark_transform_dirty()
+
+
+class Camera:
+    f = 500  # фокусное расстояние
+
+    def __init__(self, position=(0, 0, -10), rotation=(-30, 0, 0), scale=40):
+        self.position = list(position)
+        self._rotation = list(rotation)
+        self._scale = scale
+        self.viewport = (0, 0)
+        self.version = 0
+        self._view_matrix = None
+        self._view_projection = None
+        self._frustum = None
+
+    @property
+    def rotation(self):
+        return tuple(self._rotation)
+
+    @property
+    def scale(self):
+        return self._scale
+
+    def rotate(self, pitch, yaw):
+        self._rotation[0] += pitch
+        self._rotation[1] += yaw
+        self.invalidate()
+
+    def zoom(self, factor):
+        self._scale *= factor
+        self.invalidate()
+
+    def set_viewport(self, width, height):
+        if self.viewport != (width, height):
+            self.viewport = (width, height)
+            self.invalidate()
+
+    def set_pose(self, rotation=None, position=None, scale=None):
+        if rotation is not None:
+            self._rotation[:len(rotation)] = rotation
+        if position is not None:
+            self.position = list(position)
+        if scale is not None:
+            self._scale = scale
+        self.invalidate()
+
+    def invalidate(self):
+        self._view_matrix = None
+        self._view_projection = None
+        self._frustum = None
+        self.version += 1
+
+    def view_matrix(self):
+        # Поворот камеры: сначала вокруг Y, затем вокруг X
+        if self._view_matrix is None:
+            ax, ay = math.radians(self._rotation[0]), math.radians(self._rotation[1])
+            rot_y = np.array([[math.cos(ay), 0, math.sin(ay)],
+                              [0, 1, 0],
+                              [-math.sin(ay), 0, math.cos(ay)]])
+            rot_x = np.array([[1, 0, 0],
+                              [0, math.cos(ax), -math.sin(ax)],
+                              [0, math.sin(ax), math.cos(ax)]])
+            self._view_matrix = rot_x @ rot_y
+        return self._view_matrix
+
+    def view_projection(self):
+        # Однородная матрица: (X, Y, глубина, W), экранные координаты = (X / W, Y / W)
+        if self._view_projection is None:
+            rotation = self.view_matrix()
+            width, height = self.viewport
+            offset = self.f - self.position[2]
+            matrix = np.zeros((4, 4))
+            matrix[0, :3] = self._scale * self.f * rotation[0] + width / 2 * rotation[2]
+            matrix[0, 3] = width / 2 * offset
+            matrix[1, :3] = self._scale * self.f * rotation[1] + height / 2 * rotation[2]
+            matrix[1, 3] = height / 2 * offset
+            matrix[2, :3] = rotation[2]
+            matrix[2, 3] = -self.position[2]
+            matrix[3, :3] = rotation[2]
+            matrix[3, 3] = offset
+            self._view_projection = matrix
+        return self._view_projection
+
+    def frustum_planes(self):
+        # Плоскости (нормаль, смещение) в мировых координатах: X >= 0, X <= W * w,
+        # Y >= 0, Y <= H * w и w > 0 для строк матрицы вида-проекции
+        if self._frustum is None:
+            matrix = self.view_projection()
+            width, height = self.viewport
+            planes = np.array([matrix[0], width * matrix[3] - matrix[0],
+                               matrix[1], height * matrix[3] - matrix[1], matrix[3]])
+            planes /= np.linalg.norm(planes[:, :3], axis=1)[:, None]
+            self._frustum = planes
+        return self._frustum
+
+    def bounds_visible(self, centers, radii, box_min, box_max):
+        # Сфера или AABB целиком за одной из плоскостей - объект вне пирамиды видимости
+        planes = self.frustum_planes()
+        normals, offsets = planes[:, :3], planes[:, 3]
+        sphere_ok = (centers @ normals.T + offsets >= -radii[:, None]).all(axis=1)
+        box_center = (box_min + box_max) / 2
+        half = (box_max - box_min) / 2
+        box_ok = (box_center @ normals.T + offsets >= -(half @ np.abs(normals).T)).all(axis=1)
+        return sphere_ok & box_ok
+
+    def project_instances(self, vertices, model_matrices):
+        # Все экземпляры одного меша проецируются одним умножением: (K, N, 2), (K, N), (K, N)
+        matrices = self.view_projection() @ model_matrices
+        clip = np.einsum('kij,nj->kni', matrices[:, :, :3], vertices) + matrices[:, None, :, 3]
+        w = clip[..., 3]
+        valid = w > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            xy = clip[..., :2] / w[..., None]
+        return xy, clip[..., 2], valid
+
+    def eye_position(self):
+        # Центр проекции: в координатах вида (0, 0, cz - f), w там обращается в ноль
+        return self.view_matrix().T @ np.array([0, 0, self.position[2] - self.f])
+
+    def unproject(self, x, y, depth):
+        # Обратно к project: мировые точки по экранным координатам и глубине (float32).
+        # Однородная точка inverse @ (x W, y W, depth, W) должна иметь w = 1, отсюда W
+        inverse = np.linalg.inv(self.view_projection()).astype(np.float32)
+        x, y, depth = (np.asarray(values, dtype=np.float32) for values in (x, y, depth))
+        w = (1 - inverse[3, 2] * depth) / (inverse[3, 0] * x + inverse[3, 1] * y + inverse[3, 3])
+        return (np.outer(x * w, inverse[:3, 0]) + np.outer(y * w, inverse[:3, 1])
+                + np.outer(depth, inverse[:3, 2]) + np.outer(w, inverse[:3, 3]))
+
+    def project(self, points):
+        matrix = self.view_projection()
+        clip = np.asarray(points, dtype=float).reshape(-1, 3) @ matrix[:, :3].T + matrix[:, 3]
+        w = clip[:, 3]
+        valid = w > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            xy = clip[:, :2] / w[:, None]
+        return xy, clip[:, 2], valid
+
+
+class FrameStats:
+    def __init__(self, window=240):
+        # Скользящее окно последних кадров: время этапов в секундах и счётчики
+        self.frames = collections.deque(maxlen=window)
+        self._log_path = None
+        self._log = None
+        self.current = None
+        self._start = 0
+
+    @property
+    def log_path(self):
+        return self._log_path
+
+    @log_path.setter
+    def log_path(self, path):
+        # Журнал открывается один раз, кадры дописываются в него строками JSON
+        self.close()
+        self._log_path = path
+        if path:
+            self._log = open(path, 'a', encoding='utf-8')
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def begin_frame(self):
+        self.current = {'stages': {}, 'counters': {}}
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        if self.current is not None:
+            stages = self.current['stages']
+            stages[name] = stages.get(name, 0) + seconds
+
+    def count(self, name, value=1):
+        if self.current is not None:
+            counters = self.current['counters']
+            counters[name] = counters.get(name, 0) + value
+
+    def end_frame(self):
+        frame = self.current
+        frame['stages']['frame'] = time.perf_counter() - self._start
+        frame['time'] = time.time()
+        self.frames.append(frame)
+        self.current = None
+        if self._log is not None:
+            self._log.write(json.dumps(frame) + '\n')
+            self._log.flush()
+        return frame
+
+    def last(self):
+        return self.frames[-1] if self.frames else None
+
+    def percentiles(self, name, section='stages'):
+        # p50/p95/max одного этапа или счётчика, без расчёта остальных
+        samples = [frame[section][name] for frame in self.frames if name in frame[section]]
+        if not samples:
+            return None
+        p50, p95 = np.percentile(samples, [50, 95])
+        return {'p50': float(p50), 'p95': float(p95), 'max': float(max(samples))}
+
+    def summary(self):
+        # {'stages': {имя: {'p50', 'p95', 'max'}}, 'counters': {...}} по окну кадров
+        summary = {}
+        for section in ('stages', 'counters'):
+            values = {}
+            for frame in self.frames:
+                for name, value in frame[section].items():
+                    values.setdefault(name, []).append(value)
+            summary[section] = {name: {'p50': float(np.percentile(samples, 50)),
+                                       'p95': float(np.percentile(samples, 95)),
+                                       'max': float(max(samples))}
+                                for name, samples in values.items()}
+        return summary
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for frame in self.frames:
+                f.write(json.dumps(frame) + '\n')
+
+
+class SceneRenderer:
+    # Всё, что нужно для отрисовки кадра без окна: сцена, камера, настройки и кэши
+
+    def init_renderer(self):
         self.letters = []
-        self.camera_pos = [0, 0, -10]
-        self.camera_rot = [-30, 0, 0]
-        self.last_pos = QPoint()
-        self.mouse_pressed = False
-        self.scale = 40
-        self.selected_letter = None
+        self.camera = Camera()
         self.grid_size = 10
-        self.movement_step = 0.5
-        self.rotation_step = 5
 
-        self.render_mode = "z-buffer"
         self.show_faces = False
         self.show_edges = True
         self.fill_opacity = 180
         self.edge_thickness = 1
 
+        # 0 - растеризация в основном процессе, иначе пул процессов по тайлам
+        self.raster_workers = 0
+        self.tile_rasterizer = None
+
+        self._background = None
+        self._background_key = None
+        self.framebuffers = FramebufferPool()
+
+        # Сохранённый кадр: буферы, состояние сцены и экранные рамки букв
+        self._projections = {}
+        self._visibility = {}
+        self._shading = {}
+        self._frame_key = None
+        self._frame_buffers = None
+        self._frame_letters = {}
+
+        self.frame_stats = FrameStats()
+        self.show_hud = False
+        self.hud_refresh = 0.25
+        self._hud_rect = QRect()
+        self._hud_summary = None
+        self._hud_summary_time = 0
+
         self.light_position = [5, 5, -5]
         self.light_enabled = True
         self.lighting_method = "gouraud"
         self.ambient_intensity = 0.3
         self.diffuse_intensity = 0.7
+        self.specular_intensity = 0.5
+        self.shininess = 32
         self.show_light_source = True
 
-        self.previous_states = {
-            'faces': {
-                'show': True,
-                'opacity': 255,
-                'edge_thickness': 1
-            },
-            'edges': {
-                'show': True,
-                'thickness': 1
-            },
-            'light': {
-                'enabled': True,
-                'method': 'flat',
-                'ambient': 0.2,
-                'diffuse': 0.8,
-                'position': [0, 0, 0]
-            }
-        }
-
-        grid_level = 0
-        h = 4  # высота буквы
-        y_pos = grid_level + h / 2
-        # Буква С слева, повернута на 90 градусов вокруг оси Y
-        self.add_letter('С', h, 2, 1, position=[-5, y_pos, 2])
-        self.letters[-1].rotation = [0, 90, 0]
-        self.letters[-1].update_geometry()
-        # Буква Д справа, без поворота
-        self.add_letter('Д', h, 2, 1, position=[5, y_pos, 2])
-        self.letters[-1].rotation = [0, 0, 0]
-        self.letters[-1].update_geometry()
-
-    def add_letter(self, letter, height, width, depth, position=None):
-        new_letter = Letter3D(letter, height, width, depth)
-        if position:
-            new_letter.position = position
-        self.letters.append(new_letter)
-        if not self.selected_letter:
-            self.selected_letter = new_letter
-
-    def project_point(self, point, is_grid=False):
-        transformed = point.copy()
-
-        angle_y = math.radians(self.camera_rot[1])
-        angle_x = math.radians(self.camera_rot[0])
-
-        x_rot = transformed[0] * math.cos(angle_y) + transformed[2] * math.sin(angle_y)
-        z_rot = -transformed[0] * math.sin(angle_y) + transformed[2] * math.cos(angle_y)
-        transformed = [x_rot, transformed[1], z_rot]
-
-        y_rot = transformed[1] * math.cos(angle_x) - transformed[2] * math.sin(angle_x)
-        z_rot = transformed[1] * math.sin(angle_x) + transformed[2] * math.cos(angle_x)
-        transformed = [transformed[0], y_rot, z_rot]
+        # Отложенное освещение: растеризация пишет G-буфер (нормаль, позиция, базовый
+        # цвет), а изменения света только пересчитывают цвета по нему
+        self.deferred_shading = False
+        self._gbuffer = None
+        self._shade_key = None
+
+        self.preview_scale = 0.5
+        self.interacting = False
+        self._preview_image = None
+
+        # Растеризатор работает в доле разрешения окна, кадр растягивается при выводе.
+        # В автоматическом режиме доля подбирается по времени полных кадров под frame_budget
+        self.render_scale = 1.0
+        self.auto_render_scale = False
+        self.frame_budget = 1 / 30
+        self.min_render_scale = 0.25
+        self._auto_scale = 1.0
+
+    def set_raster_workers(self, workers):
+        # Сохранённый кадр может ссылаться на разделяемую память старого пула,
+        # которая закрывается вместе с ним, поэтому следующий кадр рисуется целиком
+        self._frame_key = None
+        self._frame_buffers = None
+        if self.tile_rasterizer:
+            self.tile_rasterizer.close()
+            self.tile_rasterizer = None
+        self.raster_workers = workers
+        if workers > 0:
+            self.tile_rasterizer = TileRasterizer(workers)
+
+    def effective_render_scale(self):
+        return self._auto_scale if self.auto_render_scale else self.render_scale
+
+    def raster_size(self):
+        scale = self.effective_render_scale()
+        return max(1, round(self.width() * scale)), max(1, round(self.height() * scale))
+
+    def raster_bounds(self, bounds):
+        # Экранная рамка в пикселях буфера, с запасом на округление после масштабирования
+        scale = self.effective_render_scale()
+        if not bounds or scale == 1:
+            return bounds
+        return (math.floor(bounds[0] * scale) - 1, math.floor(bounds[1] * scale) - 1,
+                math.ceil(bounds[2] * scale) + 1, math.ceil(bounds[3] * scale) + 1)
+
+    def adapt_render_scale(self, elapsed):
+        # Время растеризации растёт с площадью буфера, поэтому доля меняется как корень
+        # из отношения бюджета ко времени кадра. Шаг 5% и зона нечувствительности не дают
+        # доле дрожать и каждый кадр сбрасывать инкрементальную перерисовку
+        ratio = self.frame_budget / max(elapsed, 1e-6)
+        if 0.8 < ratio < 1.25:
+            return
+        scale = round(self._auto_scale * math.sqrt(ratio) * 20) / 20
+        self._auto_scale = min(1.0, max(self.min_render_scale, scale))
 
-        f = 500
-        z = transformed[2] - self.camera_pos[2]
-        if z + f != 0:
-            scale_factor = f / (z + f)
-            screen_x = transformed[0] * scale_factor * self.scale + self.width() / 2
-            screen_y = transformed[1] * scale_factor * self.scale + self.height() / 2
-            return QPoint(int(screen_x), int(screen_y))
+    def project_point(self, point):
+        xy, _, valid = self.camera.project(point)
+        if valid[0]:
+            return QPoint(int(xy[0, 0]), int(xy[0, 1]))
         return None
 
     def draw_grid(self, painter):
         grid_color = QColor(80, 80, 80)
         axis_color = QColor(120, 120, 120)
 
-        for i in range(-self.grid_size, self.grid_size + 1):
-            for j in range(-self.grid_size, self.grid_size + 1):
-                start = [i, 0, j]
-
-                end = [i, 0, j + 1]
-                start_view = self.transform_to_view(start)
-                end_view = self.transform_to_view(end)
-                start_screen = self.project_point(start_view, is_grid=True)
-                end_screen = self.project_point(end_view, is_grid=True)
-                if start_screen and end_screen:
-                    painter.setPen(QPen(axis_color if i == 0 or j == 0 else grid_color, 1))
-                    painter.drawLine(start_screen, end_screen)
-
-                end = [i + 1, 0, j]
-                end_view = self.transform_to_view(end)
-                end_screen = self.project_point(end_view, is_grid=True)
-                if start_screen and end_screen:
-                    painter.setPen(QPen(axis_color if i == 0 or j == 0 else grid_color, 1))
-                    painter.drawLine(start_screen, end_screen)
+        # Узлы решётки проецируются один раз, отрезки собираются по индексам узлов
+        n = self.grid_size
+        coords = np.arange(-n, n + 2)
+        ii, jj = np.meshgrid(coords, coords, indexing='ij')
+        lattice = np.stack([ii, np.zeros_like(ii), jj], axis=-1)
+        xy, _, valid = self.camera.project(lattice.reshape(-1, 3))
+        xy = xy.reshape(len(coords), len(coords), 2)
+        valid = valid.reshape(len(coords), len(coords))
+
+        start = (slice(0, 2 * n + 1), slice(0, 2 * n + 1))
+        on_axis = (ii[start] == 0) | (jj[start] == 0)
+        grid_lines, axis_lines = [], []
+        for di, dj in ((0, 1), (1, 0)):
+            end = (slice(di, 2 * n + 1 + di), slice(dj, 2 * n + 1 + dj))
+            visible = valid[start] & valid[end]
+            for lines, mask in ((grid_lines, visible & ~on_axis), (axis_lines, visible & on_axis)):
+                segments = np.concatenate([xy[start][mask], xy[end][mask]], axis=1).astype(int)
+                lines.extend(QLine(*segment) for segment in segments.tolist())
+
+        painter.setPen(QPen(grid_color, 1))
+        painter.drawLines(grid_lines)
+        painter.setPen(QPen(axis_color, 1))
+        painter.drawLines(axis_lines)
 
     def draw_axes(self, painter):
-        origin = self.project_point(self.transform_to_view([0, 0, 0]), is_grid=True)
-        if origin:
-            end = self.project_point(self.transform_to_view([5, 0, 0]), is_grid=True)
-            if end:
+        origin = self.project_point([0, 0, 0])
+        if origin is not None:
+            end = self.project_point([5, 0, 0])
+            if end is not None:
                 painter.setPen(QPen(Qt.red, 2))
                 painter.drawLine(origin, end)
 
-            end = self.project_point(self.transform_to_view([0, 5, 0]), is_grid=True)
-            if end:
+            end = self.project_point([0, 5, 0])
+            if end is not None:
                 painter.setPen(QPen(Qt.green, 2))
                 painter.drawLine(origin, end)
 
-            end = self.project_point(self.transform_to_view([0, 0, 5]), is_grid=True)
-            if end:
+            end = self.project_point([0, 0, 5])
+            if end is not None:
                 painter.setPen(QPen(Qt.blue, 2))
                 painter.drawLine(origin, end)
 
-    def get_face_depth(self, face, letter):
-        z_sum = 0
-        count = 0
-
-        for vertex in face['vertices']:
-            if isinstance(vertex, list):
-                local_vertex = vertex
-                global_vertex = [
-                    local_vertex[0] + letter.position[0],
-                    local_vertex[1] + letter.position[1],
-                    local_vertex[2] + letter.position[2]
-                ]
-            else:
-                global_vertex = letter.transformed_vertices[vertex]
-
-            angle_y = math.radians(self.camera_rot[1])
-            angle_x = math.radians(self.camera_rot[0])
-
-            x_rot = global_vertex[0] * math.cos(angle_y) + global_vertex[2] * math.sin(angle_y)
-            z_rot = -global_vertex[0] * math.sin(angle_y) + global_vertex[2] * math.cos(angle_y)
-
-            y_rot = global_vertex[1] * math.cos(angle_x) - z_rot * math.sin(angle_x)
-            z_rot = global_vertex[1] * math.sin(angle_x) + z_rot * math.cos(angle_x)
-
-            z_sum += z_rot
-            count += 1
-
-        return z_sum / count if count > 0 else 0
-
-    def is_face_visible(self, face, letter):
-        normal = face['normal'].copy()
-
-        normal_length = math.sqrt(normal[0] ** 2 + normal[1] ** 2 + normal[2] ** 2)
-        if normal_length > 0:
-            normal = [normal[0] / normal_length, normal[1] / normal_length, normal[2] / normal_length]
-
-        center = [0, 0, 0]
-        count = 0
-
-        for vertex in face['vertices']:
-            if isinstance(vertex, list):
-                center[0] += vertex[0] + letter.position[0]
-                center[1] += vertex[1] + letter.position[1]
-                center[2] += vertex[2] + letter.position[2]
+    def background_layer(self, scale=1.0):
+        # Сетка и оси перерисовываются только при смене камеры или размера окна.
+        # Для превью слой рисуется в уменьшенном разрешении и без сглаживания
+        key = (self.camera.version, self.width(), self.height(), self.grid_size, scale)
+        if self._background_key != key:
+            image = QImage(max(1, int(self.width() * scale)), max(1, int(self.height() * scale)),
+                           QImage.Format_ARGB32_Premultiplied)
+            image.fill(QColor(0, 0, 0))
+            painter = QPainter(image)
+            if scale == 1:
+                painter.setRenderHint(QPainter.Antialiasing)
             else:
-                v = letter.transformed_vertices[vertex]
-                center[0] += v[0]
-                center[1] += v[1]
-                center[2] += v[2]
-            count += 1
-
-        if count > 0:
-            center[0] /= count
-            center[1] /= count
-            center[2] /= count
-
-        view_dir = [
-            self.camera_pos[0] - center[0],
-            self.camera_pos[1] - center[1],
-            self.camera_pos[2] - center[2]
-        ]
-
-        view_length = math.sqrt(view_dir[0] ** 2 + view_dir[1] ** 2 + view_dir[2] ** 2)
-        if view_length > 0:
-            view_dir = [view_dir[0] / view_length, view_dir[1] / view_length, view_dir[2] / view_length]
-
-        dot_product = normal[0] * view_dir[0] + normal[1] * view_dir[1] + normal[2] * view_dir[2]
-        return dot_product > 0
-
-    def paintEvent(self, event):
-        self.show_faces = False  # Always only contour
-        self.show_edges = True
-        painter = QPainter(self)
+                painter.scale(scale, scale)
+            self.draw_grid(painter)
+            self.draw_axes(painter)
+            painter.end()
+            self._background = image
+            self._background_key = key
+        return self._background
+
+    def project_letters(self, letters):
+        # Устаревшие проекции пересчитываются пакетно, по одному проходу на общий меш
+        groups = {}
+        for letter in letters:
+            cached = self._projections.get(letter)
+            if cached is None or cached[0] != (self.camera.version, letter.transform_version):
+                groups.setdefault(id(letter.mesh), []).append(letter)
+
+        for group in groups.values():
+            matrices = np.stack([letter.model_matrix() for letter in group])
+            xy, depth, valid = self.camera.project_instances(group[0].vertices, matrices)
+            for i, letter in enumerate(group):
+                key = (self.camera.version, letter.transform_version)
+                self._projections[letter] = (key, (xy[i], depth[i], valid[i]))
+
+    def project_letter(self, letter):
+        self.project_letters([letter])
+        return self._projections[letter][1]
+
+    def visible_letters(self, letters):
+        # Отсечение по ограничивающим объёмам до какой-либо работы с гранями
+        stale = [letter for letter in letters
+                 if self._visibility.get(letter, (None,))[0] != (self.camera.version, letter.transform_version)]
+        if stale:
+            bounds = [letter.world_bounds() for letter in stale]
+            visible = self.camera.bounds_visible(np.array([b[0] for b in bounds]), np.array([b[1] for b in bounds]),
+                                                 np.array([b[2] for b in bounds]), np.array([b[3] for b in bounds]))
+            for letter, flag in zip(stale, visible.tolist()):
+                self._visibility[letter] = ((self.camera.version, letter.transform_version), flag)
+        return [letter for letter in letters if self._visibility[letter][1]]
+
+    def letter_bounds(self, letter):
+        # Экранная рамка буквы (x0, y0, x1, y1) с запасом на округление рёбер;
+        # () - буква ничего не рисует, None - рамку не определить (точки за камерой)
+        if not self.visible_letters([letter]):
+            return ()
+        xy, _, valid = self.project_letter(letter)
+        if not len(xy):
+            return ()
+        if not valid.all():
+            return None
+        x0, y0 = np.floor(xy.min(axis=0)).astype(int) - 1
+        x1, y1 = np.ceil(xy.max(axis=0)).astype(int) + 2
+        return (int(x0), int(y0), int(x1), int(y1))
+
+    def process_faces(self, letters):
+        # Отсечение нелицевых граней и глубина центров для всех граней всех букв одним проходом.
+        # Возвращает для каждой грани номер буквы и грани, признак видимости и глубину,
+        # а также смещение граней каждой буквы в общих массивах
+        owners, faces, centroids, normals, valid_faces, bases = [], [], [], [], [], []
+        base = 0
+        for i, letter in enumerate(letters):
+            mesh = letter.mesh
+            if mesh is None or mesh.face_count == 0:
+                bases.append(None)
+                continue
+            _, _, valid = self.project_letter(letter)
+            face_centroids, face_normals = letter.world_faces()
+            centroids.append(face_centroids)
+            normals.append(face_normals)
+            valid_faces.append(np.logical_and.reduceat(valid[mesh.face_indices], mesh.face_offsets[:-1]))
+            owners.append(np.full(mesh.face_count, i))
+            faces.append(np.arange(mesh.face_count))
+            bases.append(base)
+            base += mesh.face_count
+
+        if not centroids:
+            empty = np.zeros(0, dtype=int)
+            return empty, empty, np.zeros(0, dtype=bool), np.zeros(0), bases
+
+        centroids = np.concatenate(centroids)
+        normals = np.concatenate(normals)
+        facing = normals @ self.camera.eye_position() > np.einsum('ij,ij->i', normals, centroids)
+        depth = centroids @ self.camera.view_matrix()[2]
+        return np.concatenate(owners), np.concatenate(faces), np.concatenate(valid_faces) & facing, depth, bases
+
+    def render_image(self, image=None):
+        # Кадр рисуется в QImage тем же конвейером, окно для этого не нужно;
+        # переданное изображение подходящего размера используется повторно
+        if image is None or (image.width(), image.height()) != (self.width(), self.height()):
+            image = QImage(self.width(), self.height(), QImage.Format_ARGB32_Premultiplied)
+        painter = QPainter(image)
+        self.paint_scene(painter, image.rect())
+        painter.end()
+        return image
+
+    def paint_scene(self, painter, rect):
+        stats = self.frame_stats
+        stats.begin_frame()
         painter.setRenderHint(QPainter.Antialiasing)
+        # Скрытый виджет не получает resizeEvent, поэтому размер сверяется здесь
+        self.camera.set_viewport(self.width(), self.height())
 
-        painter.fillRect(self.rect(), QColor(0, 0, 0))
-
-        self.draw_grid(painter)
-        self.draw_axes(painter)
-
-        self.draw_z_buffer(painter)
-
+        if self.interacting:
+            self.draw_preview(painter)
+        else:
+            with stats.stage('background'):
+                painter.drawImage(rect, self.background_layer(), rect)
+            self.draw_z_buffer(painter, rect)
+
+        # Статистика рисуется по предыдущему кадру, зато её стоимость входит в overlay
+        with stats.stage('overlay'):
+            self.draw_markers(painter)
+            if self.show_hud:
+                self.draw_hud(painter)
+        stats.end_frame()
+
+    def draw_markers(self, painter):
         for letter in self.letters:
             if hasattr(letter, 'show_center') and letter.show_center:
-                center_view = self.transform_to_view(letter.transformed_center_point)
-                center_point = self.project_point(center_view)
-                if center_point:
+                center_point = self.project_point(letter.transformed_center_point)
+                if center_point is not None:
                     painter.setPen(QPen(Qt.red, 6))
                     painter.setBrush(QColor(255, 0, 0))
                     painter.drawEllipse(center_point, 3, 3)
 
         if self.show_light_source and self.light_enabled:
             light_screen_pos = self.project_point(self.light_position)
-            if light_screen_pos:
+            if light_screen_pos is not None:
                 painter.setPen(QPen(Qt.yellow, 8))
                 painter.setBrush(QColor(255, 255, 0))
                 painter.drawEllipse(light_screen_pos, 5, 5)
 
-    def draw_z_buffer(self, painter):
-        width = self.width()
-        height = self.height()
+    def draw_hud(self, painter):
+        frame = self.frame_stats.last()
+        if frame is None:
+            return
+        # Перцентили по окну кадров пересчитываются несколько раз в секунду, а не каждый кадр
+        now = time.perf_counter()
+        if self._hud_summary is None or now - self._hud_summary_time > self.hud_refresh:
+            self._hud_summary = self.frame_stats.percentiles('frame')
+            self._hud_summary_time = now
+        summary = self._hud_summary
+        lines = ["кадр: %.1f ms (p50 %.1f / p95 %.1f / max %.1f)"
+                 % (frame['stages']['frame'] * 1000, summary['p50'] * 1000, summary['p95'] * 1000,
+                    summary['max'] * 1000)]
+        # Вложенные этапы ('collect/cull') уже входят во время своего этапа и в сумму не попадают
+        lines += ["%s: %.2f ms" % (name, seconds * 1000)
+                  for name, seconds in frame['stages'].items() if name != 'frame' and '/' not in name]
+        counters = frame['counters']
+        lines += [
+            "граней отброшено: %d" % counters.get('faces_culled', 0),
+            "граней нарисовано: %d" % counters.get('faces_drawn', 0),
+            "пикселей записано: %d" % counters.get('pixels_written', 0),
+            "перерисовка: %.2f" % counters.get('overdraw', 0),
+            "разрешение рендера: %d%%" % round(counters.get('render_scale', 1) * 100),
+        ]
 
-        z_buffer = [[float('-inf') for _ in range(width)] for _ in range(height)]
-        color_buffer = [[None for _ in range(width)] for _ in range(height)]
+        metrics = painter.fontMetrics()
+        line_height = metrics.height()
+        width = max(metrics.horizontalAdvance(line) for line in lines) + 12
+        self._hud_rect = QRect(5, 5, width, line_height * len(lines) + 8)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(0, 0, 0, 160))
+        painter.drawRect(self._hud_rect)
+        painter.setPen(QColor(255, 255, 255))
+        for i, line in enumerate(lines):
+            painter.drawText(11, 9 + metrics.ascent() + i * line_height, line)
+
+    def collect_primitives(self, letters=None):
+        tri_xy, tri_z, tri_colors, tri_attributes = [], [], [], []
+
+        stats = self.frame_stats
+        timer = time.perf_counter
+        letters = self.letters if letters is None else letters
+        start = timer()
+        visible = self.visible_letters(letters)
+        stats.add_time('collect/frustum', timer() - start)
+        stats.count('letters_culled', len(letters) - len(visible))
+        letters = visible
+
+        start = timer()
+        self.project_letters(letters)
+        stats.add_time('collect/project', timer() - start)
+
+        if self.show_faces and letters:
+            start = timer()
+            owners, faces, visible, face_depth, bases = self.process_faces(letters)
+            stats.add_time('collect/cull', timer() - start)
+            stats.count('faces_culled', len(faces) - int(visible.sum()))
+            stats.count('faces_drawn', int(visible.sum()))
+
+            method = self.shading_method()
+            light_time = 0
+            start = timer()
+            tri_faces, face_colors, base_colors = [], [], []
+            for letter, base in zip(letters, bases):
+                if base is None:
+                    continue
+                mesh = letter.mesh
+                xy, depth, _ = self.project_letter(letter)
+                tri_xy.append(xy[mesh.triangles])
+                tri_z.append(depth[mesh.triangles])
+                tri_faces.append(mesh.triangle_faces + base)
+                if self.deferred_shading:
+                    tri_attributes.append(self.surface_attributes(letter, method))
+                    color = pack_color(self.base_color(letter))
+                    base_colors.append(np.full(len(mesh.triangles), color, dtype=np.uint32))
+                    continue
+                light_start = timer()
+                shading = self.face_colors(letter) if method == 'flat' else self.vertex_attributes(letter, method)
+                light_time += timer() - light_start
+                if method == 'flat':
+                    face_colors.append(shading)
+                else:
+                    tri_attributes.append(shading[mesh.triangles])
+            if tri_faces:
+                # Видимые грани от ближних к дальним одной сортировкой; треугольники грани
+                # идут подряд (номера граней возрастают), поэтому разворачиваются диапазонами
+                tri_faces = np.concatenate(tri_faces)
+                order = np.flatnonzero(visible)
+                order = order[np.argsort(face_depth[order], kind='stable')]
+                first = np.searchsorted(tri_faces, order)
+                counts = np.searchsorted(tri_faces, order, side='right') - first
+                keep = np.repeat(first - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+                tri_xy = [np.concatenate(tri_xy)[keep]]
+                tri_z = [np.concatenate(tri_z)[keep]]
+                if face_colors:
+                    tri_colors = [pack_colors(np.concatenate(face_colors)[tri_faces[keep]], self.fill_opacity)]
+                else:
+                    tri_attributes = [np.concatenate(tri_attributes)[keep]]
+                    tri_colors = [np.concatenate(base_colors)[keep] if base_colors
+                                  else np.zeros(len(keep), dtype=np.uint32)]
+            stats.add_time('collect/lighting', light_time)
+            stats.add_time('collect/sort', timer() - start - light_time)
+
+        lines = self.collect_edges(letters if self.show_edges else [])
+
+        tri_colors = np.concatenate(tri_colors) if tri_colors else np.zeros(0, dtype=np.uint32)
+        triangles = (np.concatenate(tri_xy) if tri_xy else np.zeros((0, 3, 2)),
+                     np.concatenate(tri_z) if tri_z else np.zeros((0, 3)),
+                     tri_colors,
+                     np.concatenate(tri_attributes) if tri_attributes else np.zeros((len(tri_colors), 3, 0)))
+        return triangles, lines
+
+    def collect_edges(self, letters):
+        line_xy, line_z, line_colors = [], [], []
+        for letter in letters:
+            xy, depth, valid = self.project_letter(letter)
+            edges = letter.edges[valid[letter.edges].all(axis=1)]
+            line_xy.append(xy[edges])
+            line_z.append(depth[edges])
+            line_colors.append(np.full(len(edges), pack_color([255, 255, 255]), dtype=np.uint32))  # White wireframe
+        return (np.concatenate(line_xy) if line_xy else np.zeros((0, 2, 2)),
+                np.concatenate(line_z) if line_z else np.zeros((0, 2)),
+                np.concatenate(line_colors) if line_colors else np.zeros(0, dtype=np.uint32))
+
+    def frame_key(self):
+        key = (self.camera.version, self.width(), self.height(), self.raster_size(), self.show_faces,
+               self.show_edges, self.light_enabled, self.lighting_method, self.tile_rasterizer is not None,
+               self.deferred_shading)
+        if not self.deferred_shading:
+            key += self.shading_key()
+        return key
+
+    def shading_key(self):
+        # Состояние, от которого зависят только цвета, но не растеризация
+        return (self.fill_opacity, self.ambient_intensity, self.diffuse_intensity, self.specular_intensity,
+                self.shininess, tuple(self.light_position))
+
+    def dirty_region(self):
+        # Объединение старых и новых рамок изменившихся букв; None - нужен полный кадр
+        if self._frame_key != self.frame_key() or self._frame_letters.keys() != set(self.letters):
+            return None
 
-        # Do not draw colored face contours at all
-        # Only draw all edges (wireframe) in white
+        boxes = []
         for letter in self.letters:
-            color = [255, 255, 255]  # White wireframe
-            for edge in letter.edges:
-                v1 = letter.transformed_vertices[edge[0]]
-                v2 = letter.transformed_vertices[edge[1]]
-                v1_view = self.transform_to_view(v1)
-                v2_view = self.transform_to_view(v2)
-                p1, z1 = self.project_point_with_z(v1_view)
-                p2, z2 = self.project_point_with_z(v2_view)
-                if p1 and p2:
-                    self.draw_line_with_z_buffer(p1.x(), p1.y(), p2.x(), p2.y(), z1, z2, color, z_buffer, color_buffer)
-
-        for y in range(height):
-            for x in range(width):
-                color_info = color_buffer[y][x]
-                if color_info:
-                    color = color_info['color']
-                    is_edge = color_info['is_edge']
-
-                    if is_edge:
-                        painter.setPen(QColor(color[0], color[1], color[2], 255))
-                        painter.drawPoint(x, y)
-
-    def project_point_with_z(self, point):
-        transformed = point.copy()
-
-        angle_y = math.radians(self.camera_rot[1])
-        angle_x = math.radians(self.camera_rot[0])
-
-        x_rot = transformed[0] * math.cos(angle_y) + transformed[2] * math.sin(angle_y)
-        z_rot = -transformed[0] * math.sin(angle_y) + transformed[2] * math.cos(angle_y)
-        transformed = [x_rot, transformed[1], z_rot]
-
-        y_rot = transformed[1] * math.cos(angle_x) - transformed[2] * math.sin(angle_x)
-        z_rot = transformed[1] * math.sin(angle_x) + transformed[2] * math.cos(angle_x)
-        transformed = [transformed[0], y_rot, z_rot]
-
-        z_value = transformed[2] - self.camera_pos[2]
-
-        f = 500
-        z = transformed[2] - self.camera_pos[2]
-        if z + f != 0:
-            scale_factor = f / (z + f)
-            screen_x = transformed[0] * scale_factor * self.scale + self.width() / 2
-            screen_y = transformed[1] * scale_factor * self.scale + self.height() / 2
-            return QPoint(int(screen_x), int(screen_y)), z_value
-        return None, 0
-
-    def rasterize_face_with_z_buffer(self, screen_vertices, z_values, color, z_buffer, color_buffer):
-        num_vertices = len(screen_vertices)
-
-        for i in range(1, num_vertices - 1):
-            triangle = [screen_vertices[0], screen_vertices[i], screen_vertices[i + 1]]
-            triangle_z = [z_values[0], z_values[i], z_values[i + 1]]
-            self.rasterize_triangle_with_z_buffer(triangle, triangle_z, color, z_buffer, color_buffer)
-
-        if self.show_edges:
-            for i in range(num_vertices):
-                p1 = screen_vertices[i]
-                p2 = screen_vertices[(i + 1) % num_vertices]
-                z1 = z_values[i]
-                z2 = z_values[(i + 1) % num_vertices]
-                self.draw_line_with_z_buffer(p1.x(), p1.y(), p2.x(), p2.y(), z1, z2, color, z_buffer, color_buffer)
-
-    def draw_line_with_z_buffer(self, x0, y0, x1, y1, z0, z1, color, z_buffer, color_buffer):
-        dx = abs(x1 - x0)
-        dy = abs(y1 - y0)
-        steep = dy > dx
-
-        if steep:
-            x0, y0 = y0, x0
-            x1, y1 = y1, x1
-            dx, dy = dy, dx
-
-        if x0 > x1:
-            x0, x1 = x1, x0
-            y0, y1 = y1, y0
-            z0, z1 = z1, z0
-
-        dx = x1 - x0
-        dy = abs(y1 - y0)
-        error = dx // 2
-        y = y0
-        y_step = 1 if y0 < y1 else -1
-
-        width = len(z_buffer[0])
-        height = len(z_buffer)
-
-        for x in range(x0, x1 + 1):
-            t = (x - x0) / max(1, float(x1 - x0))
-            z = z0 * (1 - t) + z1 * t
-
-            coord_x, coord_y = (y, x) if steep else (x, y)
-
-            if 0 <= coord_x < width and 0 <= coord_y < height:
-                if z > z_buffer[coord_y][coord_x]:
-                    z_buffer[coord_y][coord_x] = z
-                    color_buffer[coord_y][coord_x] = {
-                        'color': color,
-                        'is_edge': True
-                    }
-
-            error -= dy
-            if error < 0:
-                y += y_step
-                error += dx
-
-    def rasterize_triangle_with_z_buffer(self, triangle_screen, triangle_z, color, z_buffer, color_buffer):
-        min_x = max(0, min(triangle_screen[0].x(), triangle_screen[1].x(), triangle_screen[2].x()))
-        max_x = min(len(z_buffer[0]) - 1, max(triangle_screen[0].x(), triangle_screen[1].x(), triangle_screen[2].x()))
-        min_y = max(0, min(triangle_screen[0].y(), triangle_screen[1].y(), triangle_screen[2].y()))
-        max_y = min(len(z_buffer) - 1, max(triangle_screen[0].y(), triangle_screen[1].y(), triangle_screen[2].y()))
-
-        for y in range(min_y, max_y + 1):
-            for x in range(min_x, max_x + 1):
-                if self.is_point_in_triangle(x, y, triangle_screen):
-                    barycentric = self.get_barycentric_coords(
-                        x, y,
-                        triangle_screen[0].x(), triangle_screen[0].y(),
-                        triangle_screen[1].x(), triangle_screen[1].y(),
-                        triangle_screen[2].x(), triangle_screen[2].y()
-                    )
-
-                    if barycentric:
-                        z = (
-                                barycentric[0] * triangle_z[0] +
-                                barycentric[1] * triangle_z[1] +
-                                barycentric[2] * triangle_z[2]
-                        )
-
-                        if z > z_buffer[y][x]:
-                            z_buffer[y][x] = z
-                            color_buffer[y][x] = {
-                                'color': color,
-                                'is_edge': False
-                            }
-
-    def transform_to_view(self, point):
-        transformed = point.copy()
-
-        angle_y = math.radians(self.camera_rot[1])
-        angle_x = math.radians(self.camera_rot[0])
-
-        x_rot = transformed[0] * math.cos(angle_y) + transformed[2] * math.sin(angle_y)
-        z_rot = -transformed[0] * math.sin(angle_y) + transformed[2] * math.cos(angle_y)
-        transformed = [x_rot, transformed[1], z_rot]
-
-        y_rot = transformed[1] * math.cos(angle_x) - transformed[2] * math.sin(angle_x)
-        z_rot = transformed[1] * math.sin(angle_x) + transformed[2] * math.cos(angle_x)
-        transformed = [transformed[0], y_rot, z_rot]
-
-        return transformed
-
-    def is_point_in_triangle(self, x, y, triangle):
-        def sign(p1, p2, p3):
-            return (p1.x() - p3.x()) * (p2.y() - p3.y()) - (p2.x() - p3.x()) * (p1.y() - p3.y())
-
-        pt = QPoint(x, y)
-        d1 = sign(pt, triangle[0], triangle[1])
-        d2 = sign(pt, triangle[1], triangle[2])
-        d3 = sign(pt, triangle[2], triangle[0])
-
-        has_neg = (d1 < 0) or (d2 < 0) or (d3 < 0)
-        has_pos = (d1 > 0) or (d2 > 0) or (d3 > 0)
-
-        return not (has_neg and has_pos)
-
-    def get_barycentric_coords(self, x, y, x1, y1, x2, y2, x3, y3):
-        det = (y2 - y3) * (x1 - x3) + (x3 - x2) * (y1 - y3)
-
-        if abs(det) < 1e-6:
+            version, bounds = self._frame_letters[letter]
+            if version == letter.transform_version:
+                continue
+            new_bounds = self.letter_bounds(letter)
+            if bounds is None or new_bounds is None:
+                return None
+            boxes += [self.raster_bounds(box) for box in (bounds, new_bounds) if box]
+        if not boxes:
+            return (0, 0, 0, 0)
+
+        width, height = self.raster_size()
+        x0 = max(0, min(box[0] for box in boxes))
+        y0 = max(0, min(box[1] for box in boxes))
+        x1 = min(width, max(box[2] for box in boxes))
+        y1 = min(height, max(box[3] for box in boxes))
+        return (x0, y0, max(x0, x1), max(y0, y1))
+
+    def raster_primitives(self, letters=None):
+        # Примитивы в координатах буфера: экранные координаты умножаются на долю разрешения
+        triangles, lines = self.collect_primitives(letters)
+        scale = self.effective_render_scale()
+        if scale != 1:
+            triangles = (triangles[0] * scale,) + triangles[1:]
+            lines = (lines[0] * scale,) + lines[1:]
+        return triangles, lines
+
+    def render_frame(self):
+        start = time.perf_counter()
+        width, height = self.raster_size()
+        stats = self.frame_stats
+
+        region = self.dirty_region()
+        full_frame = region is None
+        deferred = self.deferred_shading and self.show_faces
+        if region is None:
+            with stats.stage('collect'):
+                triangles, lines = self.raster_primitives()
+            with stats.stage('rasterize'):
+                if deferred:
+                    # G-буфер заполняется в основном процессе
+                    z_buffer, color_buffer = self.framebuffers.frame(width, height)
+                    self._gbuffer = (self.framebuffers.get('gbuffer_normals', (height, width, 3), np.float32),
+                                     self.framebuffers.get('gbuffer_bases', (height, width), np.uint32))
+                    self._gbuffer[1].fill(0)
+                    written = rasterize_primitives(z_buffer, color_buffer, triangles, lines, gbuffer=self._gbuffer)
+                elif self.tile_rasterizer:
+                    z_buffer, color_buffer = self.tile_rasterizer.render(triangles, lines, width, height,
+                                                                         self.fragment_shader())
+                    written = self.tile_rasterizer.pixels_written
+                else:
+                    z_buffer, color_buffer = self.framebuffers.frame(width, height)
+                    written = rasterize_primitives(z_buffer, color_buffer, triangles, lines,
+                                                   shader=self.fragment_shader())
+            self._frame_buffers = (z_buffer, color_buffer)
+            region = (0, 0, width, height)
+        elif region[0] < region[2] and region[1] < region[3]:
+            # Перерисовывается только область изменений, остальной кадр берётся из буферов
+            z_buffer, color_buffer = self._frame_buffers
+            x0, y0, x1, y1 = region
+            with stats.stage('collect'):
+                letters = [letter for letter in self.letters
+                           if self._overlaps(self.raster_bounds(self.letter_bounds(letter)), region)]
+                triangles, lines = self.raster_primitives(letters)
+            with stats.stage('rasterize'):
+                z_buffer[y0:y1, x0:x1] = np.inf
+                color_buffer[y0:y1, x0:x1] = 0
+                if deferred:
+                    self._gbuffer[1][y0:y1, x0:x1] = 0
+                    written = rasterize_primitives(z_buffer, color_buffer, triangles, lines, region,
+                                                   gbuffer=self._gbuffer)
+                else:
+                    written = rasterize_primitives(z_buffer, color_buffer, triangles, lines, region,
+                                                   self.fragment_shader())
+        else:
+            written = 0
+
+        if deferred:
+            with stats.stage('shading'):
+                if full_frame or self._shade_key != self.shading_key():
+                    self.shade_gbuffer((0, 0, width, height))
+                elif region[0] < region[2] and region[1] < region[3]:
+                    self.shade_gbuffer(region)
+            self._shade_key = self.shading_key()
+
+        if written:
+            # Перерисовка - записей на каждый закрашенный пиксель области
+            x0, y0, x1, y1 = region
+            covered = np.count_nonzero(np.isfinite(self._frame_buffers[0][y0:y1, x0:x1]))
+            stats.count('pixels_written', written)
+            stats.count('overdraw', written / max(int(covered), 1))
+
+        self._frame_key = self.frame_key()
+        self._frame_letters = {letter: (letter.transform_version, self.letter_bounds(letter))
+                               for letter in self.letters}
+        self._projections = {letter: self._projections[letter]
+                             for letter in self.letters if letter in self._projections}
+        self._visibility = {letter: self._visibility[letter]
+                            for letter in self.letters if letter in self._visibility}
+        current = set(self.letters)
+        self._shading = {key: value for key, value in self._shading.items() if key[0] in current}
+
+        stats.count('render_scale', self.effective_render_scale())
+        if full_frame and self.auto_render_scale:
+            self.adapt_render_scale(time.perf_counter() - start)
+        return self._frame_buffers
+
+    def shade_gbuffer(self, region, band=64):
+        # Освещение по G-буферу во float32 полосами строк: временные массивы
+        # ограничены полосой, а не всеми освещаемыми пикселями области
+        x0, y0, x1, y1 = region
+        method = self.shading_method()
+        light = self.light_state(specular=method == "phong")
+        scale = self.effective_render_scale()
+        for top in range(y0, y1, band):
+            bottom = min(top + band, y1)
+            packed = self._gbuffer[1][top:bottom, x0:x1]
+            lit = packed != 0
+            packed = packed[lit]
+            base = np.stack([packed >> 16, packed >> 8, packed], axis=1).astype(np.uint8).astype(np.float32)
+            if not self.light_enabled:
+                colors = base
+            else:
+                ys, xs = np.nonzero(lit)
+                depth = self._frame_buffers[0][top:bottom, x0:x1][lit]
+                positions = self.camera.unproject((xs + x0) / scale, (ys + top) / scale, depth)
+                colors = light_colors(base, self._gbuffer[0][top:bottom, x0:x1][lit], positions, light)
+                if method == "flat":
+                    colors = np.floor(colors)
+            self._frame_buffers[1][top:bottom, x0:x1][lit] = pack_colors(colors, self.fill_opacity)
+
+    @staticmethod
+    def _overlaps(bounds, region):
+        if bounds is None:
+            return True
+        if not bounds:
+            return False
+        return bounds[0] < region[2] and region[0] < bounds[2] and bounds[1] < region[3] and region[1] < bounds[3]
+
+    def draw_z_buffer(self, painter, rect=None):
+        _, color_buffer = self.render_frame()
+        height, width = color_buffer.shape
+
+        # Пустые пиксели прозрачны, поэтому кадр накладывается на сетку одним drawImage;
+        # буфер уменьшенного разрешения растягивается на всё окно
+        with self.frame_stats.stage('blit'):
+            image = QImage(color_buffer.data, width, height, width * 4, QImage.Format_ARGB32_Premultiplied)
+            if (width, height) != (self.width(), self.height()):
+                painter.drawImage(QRect(0, 0, self.width(), self.height()), image)
+            elif rect is None:
+                painter.drawImage(0, 0, image)
+            else:
+                painter.drawImage(rect, image, rect)
+
+    def draw_preview(self, painter):
+        # Каркас без освещения в уменьшенном буфере; сетка рисуется в том же разрешении,
+        # и оба слоя растягиваются на всё окно одним drawImage
+        stats = self.frame_stats
+        width = max(1, int(self.width() * self.preview_scale))
+        height = max(1, int(self.height() * self.preview_scale))
+        with stats.stage('background'):
+            background = self.background_layer(self.preview_scale)
+        with stats.stage('preview'):
+            letters = self.visible_letters(self.letters)
+            self.project_letters(letters)
+            line_xy, line_z, line_colors = self.collect_edges(letters)
+            z_buffer, color_buffer = self.framebuffers.frame(width, height, 'preview_')
+            rasterize_lines(z_buffer, color_buffer, line_xy * self.preview_scale, line_z, line_colors,
+                            (0, 0, width, height))
+        with stats.stage('blit'):
+            frame = self._preview_image
+            if frame is None or (frame.width(), frame.height()) != (width, height):
+                frame = self._preview_image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+            composer = QPainter(frame)
+            composer.setCompositionMode(QPainter.CompositionMode_Source)
+            composer.drawImage(0, 0, background)
+            composer.setCompositionMode(QPainter.CompositionMode_SourceOver)
+            composer.drawImage(0, 0, QImage(color_buffer.data, width, height, width * 4,
+                                            QImage.Format_ARGB32_Premultiplied))
+            composer.end()
+            painter.drawImage(QRect(0, 0, self.width(), self.height()), frame)
+
+    def base_color(self, letter):
+        if letter.letter == 'С':
+            return [100, 100, 255]
+        return [255, 100, 100]
+
+    def shading_method(self):
+        # Без освещения все режимы рисуют грани базовым цветом
+        if not self.light_enabled or self.lighting_method not in ("gouraud", "phong"):
+            return "flat"
+        return self.lighting_method
+
+    def light_state(self, specular=False):
+        return {
+            'position': np.array(self.light_position, dtype=float),
+            'ambient': self.ambient_intensity,
+            'diffuse': self.diffuse_intensity,
+            'specular': self.specular_intensity if specular else 0,
+            'shininess': self.shininess,
+            'eye': self.camera.eye_position(),
+        }
+
+    def fragment_shader(self):
+        method = self.shading_method()
+        if method == "flat":
             return None
+        return {'method': method, 'alpha': self.fill_opacity, 'light': self.light_state(specular=True)}
+
+    def light_key(self):
+        return (tuple(self.light_position), self.ambient_intensity, self.diffuse_intensity, self.light_enabled)
+
+    def cached_shading(self, letter, kind, compute):
+        # Диффузное освещение в мировых координатах не зависит от камеры, поэтому
+        # цвета буквы пересчитываются только при смене её трансформации или света
+        key = (letter.transform_version, self.light_key() if kind != "phong" else None)
+        cached = self._shading.get((letter, kind))
+        if cached is None or cached[0] != key:
+            cached = (key, compute())
+            self._shading[(letter, kind)] = cached
+        return cached[1]
+
+    def face_colors(self, letter):
+        return self.cached_shading(letter, "flat", lambda: self._face_colors(letter))
+
+    def vertex_attributes(self, letter, method):
+        return self.cached_shading(letter, method, lambda: self._vertex_attributes(letter, method))
+
+    def surface_attributes(self, letter, method):
+        # Нормали вершин треугольников (T, 3, 3) для G-буфера.
+        # В плоском режиме все три вершины получают нормаль своей грани
+        mesh = letter.mesh
+        if method == "flat":
+            _, normals = letter.world_faces()
+            return np.repeat(normals[mesh.triangle_faces][:, None, :], 3, axis=1)
+        return letter.world_vertex_normals()[mesh.triangles]
+
+    def _face_colors(self, letter):
+        # Плоское освещение: один цвет на грань по её центру и нормали
+        base = np.array(self.base_color(letter), dtype=float)
+        centroids, normals = letter.world_faces()
+        if not self.light_enabled:
+            return np.tile(base, (len(centroids), 1))
+        return np.floor(light_colors(base, normals, centroids, self.light_state()))
+
+    def _vertex_attributes(self, letter, method):
+        # gouraud - освещённый цвет вершины, phong - нормаль, позиция и базовый цвет для попиксельного расчёта
+        base = np.tile(np.array(self.base_color(letter), dtype=float), (len(letter.vertices), 1))
+        normals = letter.world_vertex_normals()
+        positions = letter.transformed_vertices
+        if method == "gouraud":
+            return light_colors(base, normals, positions, self.light_state())
+        return np.hstack([normals, positions, base])
+
+
+# Настройки виджета, которые влияют на кадр и передаются фоновому рендеру
+RENDER_SETTINGS = ('grid_size', 'show_faces', 'show_edges', 'fill_opacity', 'edge_thickness',
+                   'light_position', 'light_enabled', 'lighting_method', 'ambient_intensity',
+                   'diffuse_intensity', 'specular_intensity', 'shininess', 'show_light_source',
+                   'deferred_shading', 'preview_scale', 'interacting', 'show_hud',
+                   'render_scale', 'auto_render_scale', 'frame_budget')
+
+
+class RenderScene(SceneRenderer):
+    # Копия сцены в потоке рендера: буквы-двойники с общими мешами и собственные кэши
+    def __init__(self, frame_stats):
+        self.init_renderer()
+        self.frame_stats = frame_stats
+        self.size = (0, 0)
+        self._pose = None
+        self._replicas = {}
+
+    def width(self):
+        return self.size[0]
+
+    def height(self):
+        return self.size[1]
+
+    def apply(self, snapshot):
+        self.size, pose, workers, settings, letters = snapshot
+        if pose != self._pose:
+            self.camera.set_pose(*pose)
+            self._pose = pose
+        if workers != self.raster_workers:
+            self.set_raster_workers(workers)
+        for name, value in zip(RENDER_SETTINGS, settings):
+            setattr(self, name, list(value) if isinstance(value, tuple) else value)
+
+        # Двойник буквы обновляется, только если у оригинала сменилась версия,
+        # поэтому кэши проекций и освещения переживают кадры без изменений
+        replicas = {}
+        for source, version, mesh_key, position, rotation, scale, reflection, show_center in letters:
+            seen, replica = self._replicas.get(source, (None, None))
+            if replica is None:
+                replica = Letter3D(*mesh_key)
+            if seen != version:
+                replica.position, replica.rotation = list(position), list(rotation)
+                replica.scale, replica.reflection = list(scale), list(reflection)
+                (replica.letter, replica.height, replica.width,
+                 replica.depth, replica.segments) = mesh_key
+                replica.update_geometry()
+            replica.show_center = show_center
+            replicas[source] = (version, replica)
+        self._replicas = replicas
+        self.letters = [replica for _, replica in replicas.values()]
+
+
+class RenderThread(QThread):
+    frame_ready = Signal(object)
+
+    def __init__(self, frame_stats, parent=None):
+        super().__init__(parent)
+        self.scene = RenderScene(frame_stats)
+        # Готовый кадр, который опоздал больше чем на max_latency, всё же показывается,
+        # иначе при непрерывном вводе окно не получило бы ни одного кадра
+        self.max_latency = 0.1
+        self.frames_dropped = 0
+        self._condition = threading.Condition()
+        self._pending = None
+        self._requested = None
+        self._stopping = False
+        self._buffers = [None, None]
+        self._presented = time.perf_counter()
+
+    def request(self, snapshot):
+        # Новый снимок вытесняет ещё не начатый; одинаковые снимки не рендерятся повторно
+        with self._condition:
+            if snapshot == self._requested:
+                return
+            if self._pending is not None:
+                self.frames_dropped += 1
+            self._requested = snapshot
+            self._pending = snapshot
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        back = 0
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    break
+                snapshot, self._pending = self._pending, None
+
+            self.scene.apply(snapshot)
+            self._buffers[back] = self.scene.render_image(self._buffers[back])
+
+            with self._condition:
+                stale = self._pending is not None
+            if stale and time.perf_counter() - self._presented < self.max_latency:
+                self.frames_dropped += 1
+                continue
+            # Окну уходит разделяемая копия: пока она на экране, запись в этот
+            # буфер отсоединит данные, поэтому кадр рисуется попеременно в два буфера
+            self.frame_ready.emit(QImage(self._buffers[back]))
+            self._presented = time.perf_counter()
+            back = 1 - back
+        self.scene.set_raster_workers(0)
+
+
+class ViewerWidget(QWidget, SceneRenderer):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.init_renderer()
+        self.last_pos = QPoint()
+        self.mouse_pressed = False
+        self.selected_letter = None
+        self.movement_step = 0.5
+        self.rotation_step = 5
 
-        alpha = ((y2 - y3) * (x - x3) + (x3 - x2) * (y - y3)) / det
-        beta = ((y3 - y1) * (x - x3) + (x1 - x3) * (y - y3)) / det
-        gamma = 1 - alpha - beta
+        self.render_mode = "z-buffer"
 
-        if 0 <= alpha <= 1 and 0 <= beta <= 1 and 0 <= gamma <= 1:
-            return [alpha, beta, gamma]
+        # Во время вращения и масштабирования камеры рисуется облегчённый кадр:
+        # только каркас в уменьшенном разрешении; полный кадр - после паузы
+        self.progressive = True
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.setInterval(150)
+        self.idle_timer.timeout.connect(self.finish_interaction)
+
+        # События мыши только накапливают смещения, которые применяются
+        # не чаще одного раза за кадр по таймеру с частотой target_fps
+        self.target_fps = 60
+        self._pending_rotation = [0.0, 0.0]
+        self._pending_zoom = 1.0
+        self._pending_move = [0.0, 0.0, 0.0]
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setInterval(round(1000 / self.target_fps))
+        self.frame_timer.timeout.connect(self.apply_pending_input)
+
+        # Фоновый рендер: поток рисует снимок сцены в задний буфер,
+        # а окно только выводит последний готовый кадр
+        self.render_thread = None
+        self._front_image = None
 
-        return None
+        self.previous_states = {
+            'faces': {
+                'show': True,
+                'opacity': 255,
+                'edge_thickness': 1
+            },
+            'edges': {
+                'show': True,
+                'thickness': 1
+            },
+            'light': {
+                'enabled': True,
+                'method': 'flat',
+                'ambient': 0.2,
+                'diffuse': 0.8,
+                'position': [0, 0, 0]
+            }
+        }
 
-    def get_face_color(self, face, letter):
-        if letter.letter == 'С':
-            base_color = [100, 100, 255]
-        else:
-            base_color = [255, 100, 100]
+        grid_level = 0
+        h = 4  # высота буквы
+        y_pos = grid_level + h / 2
+        # Буква С слева, повернута на 90 градусов вокруг оси Y
+        self.add_letter('С', h, 2, 1, position=[-5, y_pos, 2])
+        self.letters[-1].rotation = [0, 90, 0]
+        self.letters[-1].mark_transform_dirty()
+        # Буква Д справа, без поворота
+        self.add_letter('Д', h, 2, 1, position=[5, y_pos, 2])
+        self.letters[-1].rotation = [0, 0, 0]
+        self.letters[-1].mark_transform_dirty()
 
-        if not self.light_enabled:
-            return base_color
+    def add_letter(self, letter, height, width, depth, position=None):
+        new_letter = Letter3D(letter, height, width, depth)
+        if position:
+            new_letter.position = position
+            new_letter.mark_transform_dirty()
+        self.letters.append(new_letter)
+        if not self.selected_letter:
+            self.selected_letter = new_letter
 
-        normal = face['normal'].copy()
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if self.render_thread is None:
+            self.paint_scene(painter, event.rect())
+            return
+        self.render_thread.request(self.scene_snapshot())
+        if self._front_image is None:
+            painter.fillRect(event.rect(), QColor(0, 0, 0))
+        else:
+            # До прихода кадра нового размера старый растягивается на окно
+            painter.drawImage(self.rect(), self._front_image)
+
+    def scene_snapshot(self):
+        # Неизменяемый снимок всего, что влияет на кадр; читается только в потоке окна
+        settings = tuple(tuple(value) if isinstance(value, list) else value
+                         for value in (getattr(self, name) for name in RENDER_SETTINGS))
+        letters = tuple((letter, letter.transform_version,
+                         (letter.letter, letter.height, letter.width, letter.depth, letter.segments),
+                         tuple(letter.position), tuple(letter.rotation), tuple(letter.scale),
+                         tuple(letter.reflection), letter.show_center)
+                        for letter in self.letters)
+        pose = (self.camera.rotation, tuple(self.camera.position), self.camera.scale)
+        return (self.width(), self.height()), pose, self.raster_workers, settings, letters
+
+    def set_threaded_rendering(self, enabled):
+        # Пул процессов растеризации всегда один: в фоновом режиме им владеет сцена
+        # потока рендера, а окно хранит только число процессов
+        workers = self.raster_workers
+        if enabled and self.render_thread is None:
+            SceneRenderer.set_raster_workers(self, 0)
+            self.raster_workers = workers
+            self.render_thread = RenderThread(self.frame_stats, self)
+            self.render_thread.frame_ready.connect(self.present_frame)
+            self.render_thread.start()
+        elif not enabled and self.render_thread is not None:
+            self.render_thread.stop()
+            self.render_thread = None
+            self._front_image = None
+            SceneRenderer.set_raster_workers(self, workers)
+        self.update()
 
-        normal_length = math.sqrt(normal[0] ** 2 + normal[1] ** 2 + normal[2] ** 2)
-        if normal_length > 0:
-            normal = [normal[0] / normal_length, normal[1] / normal_length, normal[2] / normal_length]
+    def toggle_threaded_rendering(self, state):
+        self.set_threaded_rendering(state == Qt.Checked)
 
-        center = [0, 0, 0]
-        count = 0
+    def present_frame(self, image):
+        if self.render_thread is not None:
+            self._front_image = image
+            self.update()
 
-        for vertex in face['vertices']:
-            if isinstance(vertex, list):
-                center[0] += vertex[0] + letter.position[0]
-                center[1] += vertex[1] + letter.position[1]
-                center[2] += vertex[2] + letter.position[2]
-            else:
-                v = letter.transformed_vertices[vertex]
-                center[0] += v[0]
-                center[1] += v[1]
-                center[2] += v[2]
-            count += 1
-
-        if count > 0:
-            center[0] /= count
-            center[1] /= count
-            center[2] /= count
-
-        light_dir = [
-            self.light_position[0] - center[0],
-            self.light_position[1] - center[1],
-            self.light_position[2] - center[2]
-        ]
+    def toggle_progressive(self, state):
+        self.progressive = state == Qt.Checked
+        if not self.progressive:
+            self.idle_timer.stop()
+            self.finish_interaction()
 
-        light_length = math.sqrt(light_dir[0] ** 2 + light_dir[1] ** 2 + light_dir[2] ** 2)
-        if light_length > 0:
-            light_dir = [light_dir[0] / light_length, light_dir[1] / light_length, light_dir[2] / light_length]
+    def toggle_deferred_shading(self, state):
+        self.deferred_shading = state == Qt.Checked
+        self.update()
 
-        dot_product = max(0, normal[0] * light_dir[0] + normal[1] * light_dir[1] + normal[2] * light_dir[2])
+    def set_render_scale(self, scale):
+        # None - доля разрешения подбирается автоматически под бюджет кадра
+        self.auto_render_scale = scale is None
+        if scale is not None:
+            self.render_scale = scale
+        self.update()
 
-        if self.lighting_method == "flat":
-            light_factor = self.ambient_intensity + self.diffuse_intensity * dot_product
-        elif self.lighting_method == "gouraud":
-            light_factor = self.ambient_intensity + self.diffuse_intensity * dot_product
-        elif self.lighting_method == "phong":
-            light_factor = self.ambient_intensity + self.diffuse_intensity * dot_product
-        else:
-            light_factor = self.ambient_intensity + self.diffuse_intensity * dot_product
+    def set_frame_budget(self, milliseconds):
+        self.frame_budget = milliseconds / 1000
+        self.update()
 
-        color = [
-            min(255, int(base_color[0] * light_factor)),
-            min(255, int(base_color[1] * light_factor)),
-            min(255, int(base_color[2] * light_factor))
-        ]
+    def toggle_hud(self, state):
+        self.show_hud = state == Qt.Checked
+        self.update()
 
-        return color
+    def update_letter(self, letter):
+        # Обновляется только та часть окна, которую буква занимала и занимает теперь
+        if self.render_thread is not None:
+            self.update()
+            return
+        old = self._frame_letters.get(letter, (None, None))[1]
+        new = self.letter_bounds(letter)
+        if old is None or new is None:
+            self.update()
+            return
+        boxes = [box for box in (old, new) if box]
+        if boxes:
+            margin = 6  # центр буквы рисуется кружком поверх кадра
+            x0, y0 = min(box[0] for box in boxes) - margin, min(box[1] for box in boxes) - margin
+            x1, y1 = max(box[2] for box in boxes) + margin, max(box[3] for box in boxes) + margin
+            self.update(QRect(x0, y0, x1 - x0, y1 - y0))
+        if self.show_hud:
+            self.update(self._hud_rect)
+
+    def resizeEvent(self, event):
+        self.camera.set_viewport(self.width(), self.height())
+        self.framebuffers.resize(*self.raster_size())
+        super().resizeEvent(event)
 
     def mousePressEvent(self, event):
         self.last_pos = QPoint(int(event.position().x()), int(event.position().y()))
@@ -790,24 +1970,69 @@ class ViewerWidget(QWidget):
         dy = current_pos.y() - self.last_pos.y()
 
         if event.buttons() & Qt.LeftButton:
-            self.camera_rot[1] += dx * 0.5
-            self.camera_rot[0] += dy * 0.5
+            self._pending_rotation[0] += dy * 0.5
+            self._pending_rotation[1] += dx * 0.5
         elif event.buttons() & Qt.RightButton:
             if self.selected_letter:
                 if event.modifiers() & Qt.ShiftModifier:
-                    self.selected_letter.position[1] += dy * 0.1
+                    self._pending_move[1] += dy * 0.1
                 elif event.modifiers() & Qt.ControlModifier:
-                    self.selected_letter.position[2] -= dy * 0.1
+                    self._pending_move[2] -= dy * 0.1
                 else:
-                    self.selected_letter.position[0] += dx * 0.1
-                self.selected_letter.update_geometry()
+                    self._pending_move[0] += dx * 0.1
 
         self.last_pos = current_pos
-        self.update()
+        self.schedule_input()
 
     def wheelEvent(self, event):
         delta = event.angleDelta().y()
-        self.scale *= pow(1.001, delta)
+        self._pending_zoom *= pow(1.001, delta)
+        self.schedule_input()
+
+    def schedule_input(self):
+        if not self.frame_timer.isActive():
+            self.frame_timer.start()
+
+    def apply_pending_input(self):
+        # Всё накопленное за кадр применяется одним изменением камеры и буквы
+        camera_changed = False
+        if self._pending_rotation != [0.0, 0.0]:
+            self.camera.rotate(*self._pending_rotation)
+            self._pending_rotation = [0.0, 0.0]
+            camera_changed = True
+        if self._pending_zoom != 1.0:
+            self.camera.zoom(self._pending_zoom)
+            self._pending_zoom = 1.0
+            camera_changed = True
+        if self._pending_move != [0.0, 0.0, 0.0]:
+            if self.selected_letter:
+                for axis in range(3):
+                    self.selected_letter.position[axis] += self._pending_move[axis]
+                self.selected_letter.mark_transform_dirty()
+                if not camera_changed:
+                    self.update_letter(self.selected_letter)
+            self._pending_move = [0.0, 0.0, 0.0]
+        elif not camera_changed:
+            # Ввода не было целый кадр - таймер останавливается до следующего события
+            self.frame_timer.stop()
+            return
+
+        if camera_changed:
+            self.begin_interaction()
+            self.update()
+
+    def set_target_fps(self, fps):
+        self.target_fps = fps
+        self.frame_timer.setInterval(round(1000 / fps))
+
+    def begin_interaction(self):
+        # Перезапуск таймера отменяет уже запланированный полный кадр
+        if self.progressive:
+            self.interacting = True
+            self.idle_timer.start()
+
+    def finish_interaction(self):
+        self.interacting = False
         self.update()
 
     def move_selected(self, axis, direction):
@@ -819,24 +2044,24 @@ class ViewerWidget(QWidget):
                 self.selected_letter.position[1] += step
             elif axis == 'z':
                 self.selected_letter.position[2] += step
-            self.selected_letter.update_geometry()
-            self.update()
+            self.selected_letter.mark_transform_dirty()
+            self.update_letter(self.selected_letter)
 
     def reflect_selected(self, axis):
         if self.selected_letter:
             self.selected_letter.reflect(axis)
-            self.update()
+            self.update_letter(self.selected_letter)
 
     def rotate_selected(self, axis, direction):
         if self.selected_letter:
             self.selected_letter.rotate(axis, direction * self.rotation_step)
-            self.update()
+            self.update_letter(self.selected_letter)
 
     def scale_selected(self, axis, direction):
         if self.selected_letter:
             factor = 1.1 if direction > 0 else 1 / 1.1
             self.selected_letter.scale_object(axis, factor)
-            self.update()
+            self.update_letter(self.selected_letter)
 
     def set_rotation_step(self, value):
         self.rotation_step = value
@@ -844,7 +2069,14 @@ class ViewerWidget(QWidget):
     def set_uniform_scale(self, scale):
         if self.selected_letter:
             self.selected_letter.set_uniform_scale(scale)
-            self.update()
+            self.update_letter(self.selected_letter)
+
+    def set_raster_workers(self, workers):
+        if self.render_thread is not None:
+            self.raster_workers = workers
+        else:
+            SceneRenderer.set_raster_workers(self, workers)
+        self.update()
 
     def set_render_mode(self, mode):
         self.render_mode = mode
@@ -1190,6 +2422,88 @@ class MainWindow(QMainWindow):
         transform_layout.addWidget(reflection_group)
         tab_widget.addTab(transform_tab, "Трансформации")
 
+        display_tab = QWidget()
+        display_layout = QVBoxLayout(display_tab)
+        display_layout.setSpacing(5)
+
+        display_group = QGroupBox("Отображение")
+        display_group_layout = QVBoxLayout(display_group)
+        display_group_layout.setContentsMargins(5, 10, 5, 5)
+
+        self.show_faces_check = QCheckBox("Показывать грани")
+        self.show_faces_check.setChecked(self.viewer.show_faces)
+        self.show_faces_check.stateChanged.connect(lambda state: self.viewer.toggle_faces(Qt.CheckState(state)))
+        display_group_layout.addWidget(self.show_faces_check)
+
+        self.show_edges_check = QCheckBox("Показывать рёбра")
+        self.show_edges_check.setChecked(self.viewer.show_edges)
+        self.show_edges_check.stateChanged.connect(lambda state: self.viewer.toggle_edges(Qt.CheckState(state)))
+        display_group_layout.addWidget(self.show_edges_check)
+
+        self.progressive_check = QCheckBox("Каркас при вращении камеры")
+        self.progressive_check.setChecked(self.viewer.progressive)
+        self.progressive_check.stateChanged.connect(lambda state: self.viewer.toggle_progressive(Qt.CheckState(state)))
+        display_group_layout.addWidget(self.progressive_check)
+
+        self.deferred_check = QCheckBox("Отложенное освещение")
+        self.deferred_check.setChecked(self.viewer.deferred_shading)
+        self.deferred_check.stateChanged.connect(lambda state: self.viewer.toggle_deferred_shading(Qt.CheckState(state)))
+        display_group_layout.addWidget(self.deferred_check)
+
+        self.threaded_check = QCheckBox("Рендер в фоновом потоке")
+        self.threaded_check.stateChanged.connect(lambda state: self.viewer.toggle_threaded_rendering(Qt.CheckState(state)))
+        display_group_layout.addWidget(self.threaded_check)
+
+        self.show_hud_check = QCheckBox("Статистика кадра")
+        self.show_hud_check.setChecked(self.viewer.show_hud)
+        self.show_hud_check.stateChanged.connect(lambda state: self.viewer.toggle_hud(Qt.CheckState(state)))
+        display_group_layout.addWidget(self.show_hud_check)
+
+        fps_layout = QHBoxLayout()
+        fps_layout.addWidget(QLabel("Частота кадров:"))
+        fps_spin = QSpinBox()
+        fps_spin.setRange(10, 240)
+        fps_spin.setValue(self.viewer.target_fps)
+        fps_spin.valueChanged.connect(self.viewer.set_target_fps)
+        fps_layout.addWidget(fps_spin)
+        display_group_layout.addLayout(fps_layout)
+
+        scale_layout = QHBoxLayout()
+        scale_layout.addWidget(QLabel("Разрешение рендера:"))
+        scale_combo = QComboBox()
+        for text, scale in (("100%", 1.0), ("75%", 0.75), ("50%", 0.5), ("25%", 0.25), ("Авто", None)):
+            scale_combo.addItem(text, scale)
+        scale_combo.currentIndexChanged.connect(lambda index: self.viewer.set_render_scale(scale_combo.itemData(index)))
+        scale_layout.addWidget(scale_combo)
+        display_group_layout.addLayout(scale_layout)
+
+        budget_layout = QHBoxLayout()
+        budget_layout.addWidget(QLabel("Бюджет кадра, мс:"))
+        budget_spin = QSpinBox()
+        budget_spin.setRange(5, 500)
+        budget_spin.setValue(round(self.viewer.frame_budget * 1000))
+        budget_spin.valueChanged.connect(self.viewer.set_frame_budget)
+        budget_layout.addWidget(budget_spin)
+        display_group_layout.addLayout(budget_layout)
+
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("Процессы растеризации:"))
+        workers_spin = QSpinBox()
+        workers_spin.setRange(0, os.cpu_count() or 1)
+        workers_spin.setValue(self.viewer.raster_workers)
+        # Пул процессов пересоздаётся только после паузы в щелчках, а не на каждое значение
+        workers_spin.setKeyboardTracking(False)
+        workers_timer = QTimer(self)
+        workers_timer.setSingleShot(True)
+        workers_timer.setInterval(400)
+        workers_timer.timeout.connect(lambda: self.viewer.set_raster_workers(workers_spin.value()))
+        workers_spin.valueChanged.connect(workers_timer.start)
+        workers_layout.addWidget(workers_spin)
+        display_group_layout.addLayout(workers_layout)
+
+        display_layout.addWidget(display_group)
+        tab_widget.addTab(display_tab, "Отображение")
+
         help_text = QLabel(
             "Управление:\n"
             "ЛКМ - вращение камеры\n"
@@ -1204,8 +2518,21 @@ class MainWindow(QMainWindow):
         self.rotation_step_spin = rotation_step_spin
         self.scale_spin = scale_spin
 
+        self.workers_spin = workers_spin
+        self.workers_timer = workers_timer
+        self.scale_combo = scale_combo
+        self.budget_spin = budget_spin
+        self.fps_spin = fps_spin
+
         self.change_selected_letter(0)
 
+    def closeEvent(self, event):
+        self.workers_timer.stop()
+        self.viewer.set_raster_workers(0)
+        self.viewer.set_threaded_rendering(False)
+        self.viewer.frame_stats.close()
+        super().closeEvent(event)
+
     def change_selected_letter(self, index):
         if index == 0:
             self.viewer.selected_letter = self.viewer.letters[0]
@@ -1237,1194 +2564,222 @@ class MainWindow(QMainWindow):
         self.viewer.set_rotation_step(value)
 
 
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = MainWindow()
-    window.show()
-    sys.exit(app.exec())
+BENCHMARK_BASE = {'resolution': (1280, 720), 'letters': 10, 'segments': 12}
+BENCHMARK_SWEEPS = {
+    'resolution': [(640, 480), (1280, 720), (1920, 1080), (3840, 2160)],
+    'letters': [2, 10, 100, 1000],
+    'segments': [6, 12, 24],
+}
+
+
+def benchmark_configs():
+    # Каждый параметр меняется по отдельности относительно базовой сцены
+    configs = []
+    for key, values in BENCHMARK_SWEEPS.items():
+        for value in values:
+            config = dict(BENCHMARK_BASE, **{key: value})
+            if config not in configs:
+                configs.append(config)
+    return configs
+
+
+def benchmark_scene(config):
+    viewer = ViewerWidget()
+    viewer.resize(*config['resolution'])
+    viewer.camera.set_viewport(*config['resolution'])
+    viewer.show_faces = True
+    viewer.letters = []
+    side = math.ceil(math.sqrt(config['letters']))
+    for i in range(config['letters']):
+        letter = Letter3D('СД'[i % 2], 4, 2, 1, config['segments'])
+        letter.position = [(i % side - side / 2) * 3, 2, (i // side) * 3]
+        letter.mark_transform_dirty()
+        viewer.letters.append(letter)
+    return viewer
+
+
+def benchmark_stages(viewer):
+    # Этапы конвейера по отдельности и целый кадр; кэши сбрасываются перед каждым замером
+    def transform():
+        for letter in viewer.letters:
+            letter.mark_transform_dirty()
+            letter.world_bounds()
+            letter.world_faces()
+
+    def project():
+        viewer.camera.invalidate()
+        viewer.project_letters(viewer.letters)
+
+    def rasterize():
+        height, width = viewer.height(), viewer.width()
+        z_buffer = np.full((height, width), np.inf, dtype=np.float32)
+        color_buffer = np.zeros((height, width), dtype=np.uint32)
+        rasterize_primitives(z_buffer, color_buffer, *primitives, shader=viewer.fragment_shader())
+
+    def grid():
+        viewer._background_key = None
+        viewer.background_layer()
+
+    def frame():
+        transform()
+        viewer.camera.invalidate()
+        viewer._frame_key = None
+        viewer.render_image()
+
+    transform()
+    primitives = viewer.collect_primitives()
+    return {'transform': transform, 'project': project, 'collect': viewer.collect_primitives,
+            'rasterize': rasterize, 'grid': grid, 'frame': frame}
+
+
+def run_benchmarks(repeat=3):
+    results = []
+    for config in benchmark_configs():
+        viewer = benchmark_scene(config)
+        stages = {}
+        for name, stage in benchmark_stages(viewer).items():
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                stage()
+                samples.append(time.perf_counter() - start)
+            samples.sort()
+            stages[name] = {'min': samples[0], 'median': samples[len(samples) // 2]}
+        width, height = config['resolution']
+        name = "%dx%d letters=%d segments=%d" % (width, height, config['letters'], config['segments'])
+        results.append({'name': name, 'resolution': [width, height], 'letters': config['letters'],
+                        'segments': config['segments'], 'stages': stages})
+        print("%-40s %s" % (name, "  ".join("%s %.1f ms" % (stage, timing['median'] * 1000)
+                                             for stage, timing in stages.items())))
+    return {'python': sys.version.split()[0], 'numpy': np.__version__, 'results': results}
+
+
+def compare_benchmarks(report, baseline, tolerance=0.2, floor=0.001):
+    # Регрессия - медиана медленнее базовой больше чем на tolerance и на floor секунд
+    base = {result['name']: result['stages'] for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        for stage, timing in result['stages'].items():
+            old = base.get(result['name'], {}).get(stage)
+            if old is None:
+                continue
+            new, old = timing['median'], old['median']
+            if new > old * (1 + tolerance) and new - old > floor:
+                regressions.append("%s / %s: %.1f ms -> %.1f ms" % (result['name'], stage, old * 1000, new * 1000))
+    return regressions
+
+
+def parse_pose(text):
+    # "наклон,поворот[,масштаб]"
+    values = [float(value) for value in text.split(',')]
+    if len(values) not in (2, 3):
+        raise argparse.ArgumentTypeError("ракурс задаётся как PITCH,YAW[,SCALE]: %r" % text)
+    pose = {'rotation': values[:2]}
+    if len(values) == 3:
+        pose['scale'] = values[2]
+    return pose
+
+
+def load_scene(path):
+    # JSON: список ракурсов или {"poses": [...], "letters": [...]}
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return data, None
+    return data.get('poses', []), data.get('letters')
+
+
+def render_batch(poses, output_dir, width, height, letters=None, show_faces=False, workers=0, stats_log=None):
+    viewer = ViewerWidget()
+    viewer.resize(width, height)
+    viewer.show_faces = show_faces
+    if letters is not None:
+        viewer.letters = []
+        for spec in letters:
+            viewer.add_letter(spec['letter'], spec.get('height', 4), spec.get('width', 2), spec.get('depth', 1),
+                              position=spec.get('position'))
+            if 'rotation' in spec:
+                viewer.letters[-1].rotation = list(spec['rotation'])
+                viewer.letters[-1].mark_transform_dirty()
+
+    os.makedirs(output_dir, exist_ok=True)
+    timings = []
+    image = None
+    try:
+        if workers:
+            # Запуск процессов и первый кадр в них не относятся к ракурсам, поэтому
+            # пробный кадр рисуется до замеров и его время печатается отдельно
+            start = time.perf_counter()
+            viewer.set_raster_workers(workers)
+            image = viewer.render_image(image)
+            print("запуск процессов растеризации: %.1f ms" % ((time.perf_counter() - start) * 1000))
+        viewer.frame_stats.log_path = stats_log
+        for i, pose in enumerate(poses):
+            viewer.camera.set_pose(pose.get('rotation'), pose.get('position'), pose.get('scale'))
+            start = time.perf_counter()
+            # Кадр сохраняется сразу, поэтому одно изображение переиспользуется для всех ракурсов
+            image = viewer.render_image(image)
+            elapsed = time.perf_counter() - start
+            path = os.path.join(output_dir, '%s.png' % pose.get('name', 'frame_%03d' % i))
+            image.save(path)
+            timings.append(elapsed)
+            print("%s: %.1f ms" % (path, elapsed * 1000))
+    finally:
+        viewer.set_raster_workers(0)
+        viewer.frame_stats.close()
+
+    if timings:
+        print("кадров: %d, среднее %.1f ms, максимум %.1f ms"
+              % (len(timings), sum(timings) / len(timings) * 1000, max(timings) * 1000))
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Просмотр 3D букв С и Д")
+    parser.add_argument('--render', metavar='DIR', help="отрисовать кадры без окна в PNG в каталог DIR")
+    parser.add_argument('--pose', action='append', type=parse_pose, default=[],
+                        help="ракурс камеры PITCH,YAW[,SCALE], можно указать несколько раз "
+                             "(отрицательные значения через '=': --pose=-30,0)")
+    parser.add_argument('--poses', metavar='JSON', help="файл с ракурсами и, при желании, буквами сцены")
+    parser.add_argument('--size', default='640x480', help="размер кадра WxH")
+    parser.add_argument('--faces', action='store_true', help="рисовать грани")
+    parser.add_argument('--workers', type=int, default=0, help="процессов для растеризации по тайлам")
+    parser.add_argument('--benchmark', metavar='JSON', help="замерить этапы конвейера и записать результаты в JSON")
+    parser.add_argument('--baseline', metavar='JSON', help="сравнить замеры с сохранёнными результатами")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="допустимое замедление относительно базы")
+    parser.add_argument('--repeat', type=int, default=3, help="повторов каждого замера")
+    parser.add_argument('--stats-log', metavar='JSONL', help="дописывать статистику каждого кадра в файл JSON lines")
+    args = parser.parse_args(argv)
+
+    if args.benchmark is not None:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        app = QApplication.instance() or QApplication(sys.argv[:1])
+        report = run_benchmarks(args.repeat)
+        with open(args.benchmark, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                regressions = compare_benchmarks(report, json.load(f), args.tolerance)
+            for regression in regressions:
+                print("регрессия: " + regression)
+            return 1 if regressions else 0
+        return 0
+
+    if args.render is None:
+        app = QApplication(sys.argv)
+        window = MainWindow()
+        window.viewer.frame_stats.log_path = args.stats_log
+        window.show()
+        return app.exec()
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    poses, letters = load_scene(args.poses) if args.poses else ([], None)
+    poses = poses + args.pose or [{}]
+    width, height = (int(value) for value in args.size.lower().split('x'))
+    render_batch(poses, args.render, width, height, letters, args.faces, args.workers, args.stats_log)
+    return 0
 
-class Letter3D:
-    def __init__(self, letter, height=4, width=2, depth=1):
-        self.letter = letter
-        self.height = height
-        self.width = width
-        self.depth = depth
-        self.position = [0, 0, 0]  # Позиция в глобальных координатах
-        self.rotation = [0, 0, 0]  # Углы поворота в градусах (вокруг глобальных осей)
-        self.scale = [1, 1, 1]  # Масштаб по глобальным осям
-        self.reflection = [1, 1, 1]  # Отражение по глобальным осям
-        self.vertices = []  # Вершины в локальных координатах
-        self.transformed_vertices = []  # Вершины в глобальных координатах
-        self.edges = []
-        self.faces = []
-        self.center_point = [0, 0, 0]  # Точка центра буквы в локальных координатах
-        self.transformed_center_point = [0, 0, 0]  # Точка центра в глобальных координатах
-        self.show_center = True  # Показывать или нет точку центра
-        self.update_geometry()
-    
-    def transform_vertex(self, vertex):
-        """Преобразует вершину из локальных координат в глобальные"""
-        # Применяем масштаб и отражение
-        transformed = [
-            vertex[0] * self.scale[0] * self.reflection[0],
-            vertex[1] * self.scale[1] * self.reflection[1],
-            vertex[2] * self.scale[2] * self.reflection[2]
-        ]
-        
-        # Поворот вокруг глобальной оси X
-        angle_x = math.radians(self.rotation[0])
-        y = transformed[1] * math.cos(angle_x) - transformed[2] * math.sin(angle_x)
-        z = transformed[1] * math.sin(angle_x) + transformed[2] * math.cos(angle_x)
-        transformed = [transformed[0], y, z]
-        
-        # Поворот вокруг глобальной оси Y
-        angle_y = math.radians(self.rotation[1])
-        x = transformed[0] * math.cos(angle_y) + transformed[2] * math.sin(angle_y)
-        z = -transformed[0] * math.sin(angle_y) + transformed[2] * math.cos(angle_y)
-        transformed = [x, transformed[1], z]
-        
-        # Поворот вокруг глобальной оси Z
-        angle_z = math.radians(self.rotation[2])
-        x = transformed[0] * math.cos(angle_z) - transformed[1] * math.sin(angle_z)
-        y = transformed[0] * math.sin(angle_z) + transformed[1] * math.cos(angle_z)
-        transformed = [x, y, transformed[2]]
-        
-        # Применяем перемещение в глобальных координатах
-        return [
-            transformed[0] + self.position[0],
-            transformed[1] + self.position[1],
-            transformed[2] + self.position[2]
-        ]
-
-    def update_geometry(self):
-        if self.letter == 'С':
-            self.create_letter_c()
-        elif self.letter == 'Д':
-            self.create_letter_de()
-        
-        # Вычисляем точку центра буквы (относительные координаты)
-        self.calculate_center_point()
-        
-        # После создания геометрии обновляем трансформированные вершины
-        self.transformed_vertices = [self.transform_vertex(v) for v in self.vertices]
-        # Обновляем трансформированную точку центра
-        self.transformed_center_point = self.transform_vertex(self.center_point)
-    
-    def calculate_center_point(self):
-        """Вычисляет точку центра буквы в локальных координатах"""
-        if self.letter == 'С':
-            # Для буквы С центр смещаем внутрь полукруга
-            self.center_point = [self.width * 0.6, self.height * 0.5, self.depth / 2]
-        elif self.letter == 'Д':
-            # Для буквы Д центр смещаем внутрь центральной части
-            self.center_point = [self.width / 2, self.height * 0.4, self.depth / 2]
-    
-    def toggle_center_point(self):
-        """Включает/выключает отображение точки центра"""
-        self.show_center = not self.show_center
-        return self.show_center
-    
-    def create_letter_c(self):
-        """Создает букву C (кириллическая С)"""
-        self.vertices = []
-        self.edges = []
-        self.faces = []
-        
-        h = self.height
-        w = self.width
-        d = self.depth
-        t = w * 0.15  # толщина стенки
-        
-        # Улучшенная версия русской буквы С
-        segments = 14  # увеличиваем число сегментов для более гладкой формы
-        
-        # Внешний контур - передняя часть
-        front_outer = []
-        for i in range(segments+1):
-            # Используем дугу 220 градусов вместо 180 для более закругленной С
-            angle = math.radians(110) - math.radians(220) * i / segments
-            # Смещаем центр дуги для более естественной формы
-            x = w * 0.6 + w * 0.4 * math.cos(angle)
-            y = h * 0.5 + h * 0.5 * math.sin(angle)
-            front_outer.append([x, y, 0])
-        
-        # Внутренний контур - передняя часть
-        front_inner = []
-        for i in range(segments+1):
-            angle = math.radians(110) - math.radians(220) * i / segments
-            # Уменьшаем радиус для внутреннего контура
-            x = w * 0.6 + (w * 0.4 - t) * math.cos(angle)
-            y = h * 0.5 + (h * 0.5 - t) * math.sin(angle)
-            front_inner.append([x, y, 0])
-        
-        # Создаем заднюю часть
-        back_outer = [[v[0], v[1], v[2] + d] for v in front_outer]
-        back_inner = [[v[0], v[1], v[2] + d] for v in front_inner]
-        
-        # Сохраняем вершины
-        self.vertices = front_outer + front_inner + back_outer + back_inner
-        
-        # Соединяем вершины ребрами
-        def add_edge(v1, v2):
-            edge = (min(v1, v2), max(v1, v2))
-            if edge not in self.edges:
-                self.edges.append(edge)
-        
-        # Соединяем внешний контур спереди
-        for i in range(len(front_outer) - 1):
-            add_edge(i, i + 1)
-        
-        # Соединяем внутренний контур спереди
-        inner_offset = len(front_outer)
-        for i in range(len(front_inner) - 1):
-            add_edge(inner_offset + i, inner_offset + i + 1)
-        
-        # Соединяем внешний контур сзади
-        back_offset = inner_offset + len(front_inner)
-        for i in range(len(back_outer) - 1):
-            add_edge(back_offset + i, back_offset + i + 1)
-        
-        # Соединяем внутренний контур сзади
-        back_inner_offset = back_offset + len(back_outer)
-        for i in range(len(back_inner) - 1):
-            add_edge(back_inner_offset + i, back_inner_offset + i + 1)
-        
-        # Соединяем переднюю и заднюю части
-        # Соединяем верхний и нижний края
-        add_edge(0, back_offset)  # верхний край внешний
-        add_edge(len(front_outer) - 1, back_offset + len(back_outer) - 1)  # нижний край внешний
-        add_edge(inner_offset, back_inner_offset)  # верхний край внутренний
-        add_edge(inner_offset + len(front_inner) - 1, back_inner_offset + len(back_inner) - 1)  # нижний край внутренний
-        
-        # Добавляем соединения между внешним и внутренним контурами на краях
-        add_edge(0, inner_offset)  # верхний край спереди
-        add_edge(len(front_outer) - 1, inner_offset + len(front_inner) - 1)  # нижний край спереди
-        add_edge(back_offset, back_inner_offset)  # верхний край сзади
-        add_edge(back_offset + len(back_outer) - 1, back_inner_offset + len(back_inner) - 1)  # нижний край сзади
-        
-        # Добавляем дополнительные соединения между внешним и внутренним контурами
-        # Выбираем несколько ключевых точек для соединения, чтобы не перегружать модель
-        connection_points = [segments // 4, segments // 2, 3 * segments // 4]
-        
-        for i in connection_points:
-            # Соединяем точки на передней грани
-            add_edge(i, inner_offset + i)
-            # Соединяем точки на задней грани
-            add_edge(back_offset + i, back_inner_offset + i)
-            
-            # Дополнительно соединяем соответствующие точки на передней и задней гранях
-            # для создания "перегородок" внутри буквы
-            add_edge(i, back_offset + i)
-            add_edge(inner_offset + i, back_inner_offset + i)
-            
-        # Добавляем грани
-        self.faces = [
-            # Передние грани
-            {'vertices': front_outer, 'normal': [0, 0, -1]},
-            {'vertices': front_inner, 'normal': [0, 0, 1]},
-            
-            # Задние грани
-            {'vertices': [v for v in reversed(back_outer)], 'normal': [0, 0, 1]},
-            {'vertices': [v for v in reversed(back_inner)], 'normal': [0, 0, -1]},
-            
-            # Боковые грани (верхняя и нижняя)
-            {'vertices': [front_outer[0], front_inner[0], back_inner[0], back_outer[0]], 
-             'normal': [0, 1, 0]},  # верхняя грань
-            {'vertices': [front_outer[-1], front_inner[-1], back_inner[-1], back_outer[-1]], 
-             'normal': [0, -1, 0]},  # нижняя грань
-        ]
-        
-        # Добавляем "перегородки" в качестве граней для лучшей визуализации
-        for i in connection_points:
-            # Добавляем перегородку
-            self.faces.append({
-                'vertices': [
-                    front_outer[i], 
-                    front_inner[i], 
-                    back_inner[i],
-                    back_outer[i]
-                ],
-                'normal': [math.sin(math.radians(110) - math.radians(220) * i / segments), 
-                          -math.cos(math.radians(110) - math.radians(220) * i / segments), 
-                          0]
-            })
-
-    def create_letter_de(self):
-        """Создает букву Д (кириллическая Д)"""
-        self.vertices = []
-        self.edges = []
-        self.faces = []
-        
-        h = self.height
-        w = self.width
-        d = self.depth
-        leg_h = h * 0.15  # высота ножек
-        leg_w = w * 0.1   # ширина выступа ножек
-        t = w * 0.15      # толщина стенок
-        
-        # Основные точки буквы Д (передняя часть)
-        
-        # Основной прямоугольник с ножками (внешний контур)
-        front_outer = [
-            [-leg_w, -leg_h, 0],        # низ левой ножки 
-            [w + leg_w, -leg_h, 0],     # низ правой ножки
-            [w + leg_w, 0, 0],          # низ правой стенки
-            [w, 0, 0],                  # внутренний низ правой стенки
-            [w, h - t, 0],              # верх правой стенки
-            [0, h - t, 0],              # верх левой стенки
-            [0, 0, 0],                  # внутренний низ левой стенки
-            [-leg_w, 0, 0]              # низ левой стенки
-        ]
-        
-        # Верхняя перекладина (крыша)
-        front_roof = [
-            [0, h - t, 0],              # левый край крыши
-            [w, h - t, 0],              # правый край крыши
-            [w - t, h, 0],              # правый верхний угол
-            [t, h, 0]                   # левый верхний угол
-        ]
-        
-        # Внутренний прямоугольник (полость)
-        front_inner = [
-            [t, t, 0],                  # нижний левый
-            [w - t, t, 0],              # нижний правый
-            [w - t, h - t * 2, 0],      # верхний правый
-            [t, h - t * 2, 0]           # верхний левый
-        ]
-        
-        # Задние контуры
-        back_outer = [[v[0], v[1], v[2] + d] for v in front_outer]
-        back_roof = [[v[0], v[1], v[2] + d] for v in front_roof]
-        back_inner = [[v[0], v[1], v[2] + d] for v in front_inner]
-        
-        # Сохраняем вершины
-        self.vertices = front_outer + front_roof + front_inner + back_outer + back_roof + back_inner
-        
-        # Функция для добавления ребра
-        def add_edge(v1_idx, v2_idx):
-            edge = (min(v1_idx, v2_idx), max(v1_idx, v2_idx))
-            if edge not in self.edges:
-                self.edges.append(edge)
-                
-        # Соединяем внешний контур (передний)
-        for i in range(len(front_outer)):
-            add_edge(i, (i + 1) % len(front_outer))
-            
-        # Соединяем крышу (передняя)
-        roof_offset = len(front_outer)
-        for i in range(len(front_roof)):
-            add_edge(roof_offset + i, roof_offset + (i + 1) % len(front_roof))
-            
-        # Соединяем внутренний контур (передний)
-        inner_offset = roof_offset + len(front_roof)
-        for i in range(len(front_inner)):
-            add_edge(inner_offset + i, inner_offset + (i + 1) % len(front_inner))
-            
-        # Соединяем внешний контур (задний)
-        back_offset = inner_offset + len(front_inner)
-        for i in range(len(back_outer)):
-            add_edge(back_offset + i, back_offset + (i + 1) % len(back_outer))
-            
-        # Соединяем крышу (задняя)
-        back_roof_offset = back_offset + len(back_outer)
-        for i in range(len(back_roof)):
-            add_edge(back_roof_offset + i, back_roof_offset + (i + 1) % len(back_roof))
-            
-        # Соединяем внутренний контур (задний)
-        back_inner_offset = back_roof_offset + len(back_roof)
-        for i in range(len(back_inner)):
-            add_edge(back_inner_offset + i, back_inner_offset + (i + 1) % len(back_inner))
-            
-        # Соединяем переднюю и заднюю части
-        # Внешний контур
-        for i in range(len(front_outer)):
-            add_edge(i, back_offset + i)
-            
-        # Крыша
-        for i in range(len(front_roof)):
-            add_edge(roof_offset + i, back_roof_offset + i)
-            
-        # Внутренний контур
-        for i in range(len(front_inner)):
-            add_edge(inner_offset + i, back_inner_offset + i)
-            
-        # Соединяем крышу с основным контуром
-        add_edge(5, roof_offset)        # левый угол
-        add_edge(4, roof_offset + 1)    # правый угол
-        add_edge(back_offset + 5, back_roof_offset)     # левый задний угол
-        add_edge(back_offset + 4, back_roof_offset + 1) # правый задний угол
-        
-        # Добавляем грани
-        self.faces = [
-            # Передние грани
-            {'vertices': front_outer, 'normal': [0, 0, -1]},
-            {'vertices': front_roof, 'normal': [0, 0, -1]},
-            {'vertices': front_inner, 'normal': [0, 0, 1]},
-            
-            # Задние грани
-            {'vertices': back_outer, 'normal': [0, 0, 1]},
-            {'vertices': back_roof, 'normal': [0, 0, 1]},
-            {'vertices': back_inner, 'normal': [0, 0, -1]},
-        ]
-
-    def reflect(self, axis):
-        if axis == 'x':
-            self.reflection[0] = -self.reflection[0]
-        elif axis == 'y':
-            self.reflection[1] = -self.reflection[1]
-        elif axis == 'z':
-            self.reflection[2] = -self.reflection[2]
-        self.update_geometry()
-
-    def rotate(self, axis, angle):
-        if axis == 'x':
-            self.rotation[0] += angle
-        elif axis == 'y':
-            self.rotation[1] += angle
-        elif axis == 'z':
-            self.rotation[2] += angle
-        self.update_geometry()
-
-    def scale_object(self, axis, factor):
-        if axis == 'x':
-            self.scale[0] *= factor
-        elif axis == 'y':
-            self.scale[1] *= factor
-        elif axis == 'z':
-            self.scale[2] *= factor
-        self.update_geometry()
-
-    def set_uniform_scale(self, scale):
-        self.scale = [scale, scale, scale]
-        self.update_geometry()
-
-class ViewerWidget(QWidget):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.letters = []
-        self.camera_pos = [0, 0, -10]
-        self.camera_rot = [0, 0, 0]
-        self.last_pos = QPoint()
-        self.mouse_pressed = False
-        self.scale = 40
-        self.selected_letter = None
-        self.grid_size = 10
-        self.movement_step = 0.5  # Шаг перемещения для кнопок
-        self.rotation_step = 5  # Начальный шаг поворота в градусах
-        
-        # Настройки для второго этапа:
-        self.render_mode = "z-buffer"  # Режим рендеринга: "wireframe", "depth-sort", "z-buffer"
-        self.show_faces = True  # Показывать заливку граней
-        self.show_edges = True  # Показывать рёбра
-        self.fill_opacity = 180  # Непрозрачность заливки (0-255)
-        self.edge_thickness = 1  # Толщина рёбер в пикселях
-        
-        # Добавляем буквы
-        self.add_letter('С', 4, 2, 1, position=[-3, 0, 0])
-        self.add_letter('Д', 4, 2, 1, position=[3, 0, 0])
-    
-    def add_letter(self, letter, height, width, depth, position=None):
-        new_letter = Letter3D(letter, height, width, depth)
-        if position:
-            new_letter.position = position
-        self.letters.append(new_letter)
-        if not self.selected_letter:
-            self.selected_letter = new_letter
-    
-    def project_point(self, point, is_grid=False):
-        """Проецирует точку из глобальных координат на экран"""
-        if is_grid:
-            transformed = point.copy()
-        else:
-            # Точка уже в глобальных координатах
-            transformed = point.copy()
-        
-        # Поворот камеры
-        angle_y = math.radians(self.camera_rot[1])
-        angle_x = math.radians(self.camera_rot[0])
-        
-        # Поворот вокруг Y
-        x_rot = transformed[0] * math.cos(angle_y) + transformed[2] * math.sin(angle_y)
-        z_rot = -transformed[0] * math.sin(angle_y) + transformed[2] * math.cos(angle_y)
-        transformed = [x_rot, transformed[1], z_rot]
-        
-        # Поворот вокруг X
-        y_rot = transformed[1] * math.cos(angle_x) - transformed[2] * math.sin(angle_x)
-        z_rot = transformed[1] * math.sin(angle_x) + transformed[2] * math.cos(angle_x)
-        transformed = [transformed[0], y_rot, z_rot]
-        
-        # Перспективная проекция
-        f = 500  # фокусное расстояние
-        z = transformed[2] - self.camera_pos[2]
-        if z + f != 0:
-            scale_factor = f / (z + f)
-            screen_x = transformed[0] * scale_factor * self.scale + self.width() / 2
-            screen_y = transformed[1] * scale_factor * self.scale + self.height() / 2
-            return QPoint(int(screen_x), int(screen_y))
-        return None
-
-    def draw_grid(self, painter):
-        # Рисуем сетку
-        grid_color = QColor(80, 80, 80)  # Увеличиваем яркость сетки
-        axis_color = QColor(120, 120, 120)  # Увеличиваем яркость осей
-        
-        # Рисуем горизонтальные линии
-        for i in range(-self.grid_size, self.grid_size + 1):
-            for j in range(-self.grid_size, self.grid_size + 1):
-                start = [i, 0, j]
-                
-                # Линии параллельные оси X
-                end = [i, 0, j + 1]
-                start_screen = self.project_point(start, is_grid=True)
-                end_screen = self.project_point(end, is_grid=True)
-                if start_screen and end_screen:
-                    painter.setPen(QPen(axis_color if i == 0 or j == 0 else grid_color, 1))
-                    painter.drawLine(start_screen, end_screen)
-                
-                # Линии параллельные оси Z
-                end = [i + 1, 0, j]
-                end_screen = self.project_point(end, is_grid=True)
-                if start_screen and end_screen:
-                    painter.setPen(QPen(axis_color if i == 0 or j == 0 else grid_color, 1))
-                    painter.drawLine(start_screen, end_screen)
-
-    def draw_axes(self, painter):
-        # Рисуем оси координат
-        origin = self.project_point([0, 0, 0], is_grid=True)
-        if origin:
-            # Ось X (красная)
-            end = self.project_point([5, 0, 0], is_grid=True)
-            if end:
-                painter.setPen(QPen(Qt.red, 2))
-                painter.drawLine(origin, end)
-            
-            # Ось Y (зеленая)
-            end = self.project_point([0, 5, 0], is_grid=True)
-            if end:
-                painter.setPen(QPen(Qt.green, 2))
-                painter.drawLine(origin, end)
-            
-            # Ось Z (синяя)
-            end = self.project_point([0, 0, 5], is_grid=True)
-            if end:
-                painter.setPen(QPen(Qt.blue, 2))
-                painter.drawLine(origin, end)
-
-    def get_face_depth(self, face, letter):
-        # Вычисляем среднюю Z-координату грани после всех преобразований
-        z_sum = 0
-        count = 0
-        
-        for vertex in face['vertices']:
-            if isinstance(vertex, list):
-                # Это локальные координаты
-                local_vertex = vertex
-                global_vertex = [
-                    local_vertex[0] + letter.position[0],
-                    local_vertex[1] + letter.position[1],
-                    local_vertex[2] + letter.position[2]
-                ]
-            else:
-                # Это индекс вершины в списке transformed_vertices
-                global_vertex = letter.transformed_vertices[vertex]
-            
-            # Поворот камеры
-            angle_y = math.radians(self.camera_rot[1])
-            angle_x = math.radians(self.camera_rot[0])
-            
-            # Поворот вокруг Y
-            x_rot = global_vertex[0] * math.cos(angle_y) + global_vertex[2] * math.sin(angle_y)
-            z_rot = -global_vertex[0] * math.sin(angle_y) + global_vertex[2] * math.cos(angle_y)
-            
-            # Поворот вокруг X
-            y_rot = global_vertex[1] * math.cos(angle_x) - z_rot * math.sin(angle_x)
-            z_rot = global_vertex[1] * math.sin(angle_x) + z_rot * math.cos(angle_x)
-            
-            z_sum += z_rot
-            count += 1
-        
-        return z_sum / count if count > 0 else 0
-
-    def is_face_visible(self, face, letter):
-        """Проверяет видимость грани в зависимости от её нормали и положения камеры"""
-        # Вычисляем нормаль грани в мировых координатах
-        normal = face['normal'].copy()
-        
-        # Нормализуем нормаль (убедимся, что длина = 1)
-        normal_length = math.sqrt(normal[0]**2 + normal[1]**2 + normal[2]**2)
-        if normal_length > 0:
-            normal = [normal[0]/normal_length, normal[1]/normal_length, normal[2]/normal_length]
-        
-        # Вычисляем центр грани
-        center = [0, 0, 0]
-        count = 0
-        
-        for vertex in face['vertices']:
-            if isinstance(vertex, list):
-                # Это локальные координаты
-                center[0] += vertex[0] + letter.position[0]
-                center[1] += vertex[1] + letter.position[1]
-                center[2] += vertex[2] + letter.position[2]
-            else:
-                # Это индекс вершины в списке transformed_vertices
-                v = letter.transformed_vertices[vertex]
-                center[0] += v[0]
-                center[1] += v[1]
-                center[2] += v[2]
-            count += 1
-            
-        if count > 0:
-            center[0] /= count
-            center[1] /= count
-            center[2] /= count
-        
-        # Вычисляем вектор от центра грани к камере
-        view_dir = [
-            self.camera_pos[0] - center[0], 
-            self.camera_pos[1] - center[1], 
-            self.camera_pos[2] - center[2]
-        ]
-        
-        # Нормализуем вектор направления взгляда
-        view_length = math.sqrt(view_dir[0]**2 + view_dir[1]**2 + view_dir[2]**2)
-        if view_length > 0:
-            view_dir = [view_dir[0]/view_length, view_dir[1]/view_length, view_dir[2]/view_length]
-        
-        # Грань видима, если угол между нормалью и направлением взгляда меньше 90 градусов
-        dot_product = normal[0] * view_dir[0] + normal[1] * view_dir[1] + normal[2] * view_dir[2]
-        return dot_product > 0
-
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing)
-        
-        # Черный фон
-        painter.fillRect(self.rect(), QColor(0, 0, 0))
-        
-        # Рисуем сетку и оси
-        self.draw_grid(painter)
-        self.draw_axes(painter)
-        
-        # Используем только режим Z-буфера
-        self.draw_z_buffer(painter)
-        
-        # Рисуем точки центра букв
-        for letter in self.letters:
-            if hasattr(letter, 'show_center') and letter.show_center:
-                center_point = self.project_point(letter.transformed_center_point)
-                if center_point:
-                    # Используем красный цвет для точки центра
-                    painter.setPen(QPen(Qt.red, 6))
-                    painter.setBrush(QColor(255, 0, 0))
-                    # Рисуем точку большего размера
-                    painter.drawEllipse(center_point, 3, 3)
-
-    def draw_z_buffer(self, painter):
-        """Отображение с использованием Z-буфера (имитация)"""
-        # Собираем все грани всех букв для Z-буфера
-        all_faces = []
-        for letter in self.letters:
-            for face in letter.faces:
-                # Пропускаем невидимые грани
-                if not self.is_face_visible(face, letter):
-                    continue
-                
-                depth = self.get_face_depth(face, letter)
-                color = self.get_face_color(face, letter)
-                
-                # Усиливаем контраст в цвете для Z-буфера
-                enhanced_color = []
-                for c in color:
-                    enhanced_color.append(min(255, int(c * 1.2)))
-                
-                # Преобразуем вершины грани в экранные координаты
-                screen_vertices = []
-                all_vertices_visible = True
-                
-                for vertex in face['vertices']:
-                    if isinstance(vertex, list):
-                        # Это локальные координаты
-                        local_vertex = vertex
-                        global_vertex = [
-                            local_vertex[0] + letter.position[0],
-                            local_vertex[1] + letter.position[1],
-                            local_vertex[2] + letter.position[2]
-                        ]
-                        screen_pos = self.project_point(global_vertex)
-                    else:
-                        # Это индекс вершины в списке transformed_vertices
-                        global_vertex = letter.transformed_vertices[vertex]
-                        screen_pos = self.project_point(global_vertex)
-                    
-                    if screen_pos:
-                        screen_vertices.append(screen_pos)
-                    else:
-                        all_vertices_visible = False
-                        break
-                
-                # Добавляем грань только если все её вершины видимы и их достаточно для полигона
-                if all_vertices_visible and len(screen_vertices) >= 3:
-                    all_faces.append({
-                        'screen_vertices': screen_vertices,
-                        'depth': depth,
-                        'color': enhanced_color,
-                        'letter': letter
-                    })
-        
-        # Сортируем грани по глубине (от дальних к ближним)
-        all_faces.sort(key=lambda f: f['depth'], reverse=True)
-        
-        # Рисуем грани в порядке от дальних к ближним
-        for face in all_faces:
-            points = face['screen_vertices']
-            color = face['color']
-            
-            if len(points) < 3:
-                continue  # Пропускаем, если недостаточно точек для полигона
-                
-            # Создаем полигон для отрисовки
-            polygon = QPolygon()
-            for point in points:
-                polygon.append(point)
-            
-            # Рисуем заливку если включено отображение граней
-            if self.show_faces:
-                # Используем высокую непрозрачность для лучшей визуализации
-                face_color = QColor(color[0], color[1], color[2], self.fill_opacity)
-                painter.setBrush(face_color)
-                painter.setPen(Qt.NoPen)
-                painter.drawPolygon(polygon)
-            
-            # Рисуем контур грани если включено отображение рёбер
-            if self.show_edges:
-                edge_color = QColor(color[0], color[1], color[2])
-                edge_color.setAlpha(255)  # Полностью непрозрачные рёбра
-                painter.setBrush(Qt.NoBrush)
-                painter.setPen(QPen(edge_color, self.edge_thickness))
-                painter.drawPolygon(polygon)
-
-    def get_face_color(self, face, letter):
-        """Вычисляет цвет грани в зависимости от освещения"""
-        # Базовый цвет в зависимости от типа буквы
-        if letter.letter == 'С':
-            base_color = [100, 100, 255]  # Синий для буквы С
-        else:
-            base_color = [255, 100, 100]  # Красный для буквы Д
-        
-        # Вычисляем нормаль грани в мировых координатах
-        normal = face['normal']
-        
-        # Направление света (сверху-сзади)
-        light_dir = [0, -0.5, -1]
-        # Нормализуем направление света
-        light_length = math.sqrt(light_dir[0]**2 + light_dir[1]**2 + light_dir[2]**2)
-        light_dir = [light_dir[0]/light_length, light_dir[1]/light_length, light_dir[2]/light_length]
-        
-        # Вычисляем косинус угла между нормалью и направлением света
-        dot_product = abs(normal[0] * light_dir[0] + normal[1] * light_dir[1] + normal[2] * light_dir[2])
-        
-        # Коэффициент освещенности (от 0.3 до 1.0, чтобы не было полностью черных граней)
-        light_factor = 0.3 + 0.7 * dot_product
-        
-        # Применяем освещение к базовому цвету
-        color = [
-            min(255, int(base_color[0] * light_factor)),
-            min(255, int(base_color[1] * light_factor)),
-            min(255, int(base_color[2] * light_factor))
-        ]
-        
-        return color
-
-    def mousePressEvent(self, event):
-        self.last_pos = QPoint(int(event.position().x()), int(event.position().y()))
-        self.mouse_pressed = True
-
-    def mouseReleaseEvent(self, event):
-        self.mouse_pressed = False
-
-    def mouseMoveEvent(self, event):
-        if not self.mouse_pressed:
-            return
-            
-        current_pos = QPoint(int(event.position().x()), int(event.position().y()))
-        dx = current_pos.x() - self.last_pos.x()
-        dy = current_pos.y() - self.last_pos.y()
-        
-        if event.buttons() & Qt.LeftButton:  # Вращение камеры
-            self.camera_rot[1] += dx * 0.5
-            self.camera_rot[0] += dy * 0.5
-        elif event.buttons() & Qt.RightButton:  # Перемещение объекта по глобальным осям
-            if self.selected_letter:
-                if event.modifiers() & Qt.ShiftModifier:  # Перемещение по глобальной Y (вперед/назад)
-                    self.selected_letter.position[1] += dy * 0.1
-                elif event.modifiers() & Qt.ControlModifier:  # Перемещение по глобальной Z (вверх/вниз)
-                    self.selected_letter.position[2] -= dy * 0.1
-                else:  # Перемещение по глобальной X (влево/вправо)
-                    self.selected_letter.position[0] += dx * 0.1
-                # После перемещения обновляем трансформированные вершины
-                self.selected_letter.update_geometry()
-        
-        self.last_pos = current_pos
-        self.update()
-
-    def wheelEvent(self, event):
-        delta = event.angleDelta().y()
-        self.scale *= pow(1.001, delta)
-        self.update()
-
-    def move_selected(self, axis, direction):
-        """Перемещение объекта по глобальным осям координат"""
-        if self.selected_letter:
-            step = direction * self.movement_step
-            if axis == 'x':  # Перемещение по глобальной оси X (влево/вправо)
-                self.selected_letter.position[0] += step
-            elif axis == 'y':  # Перемещение по глобальной оси Y (вперед/назад)
-                self.selected_letter.position[1] += step
-            elif axis == 'z':  # Перемещение по глобальной оси Z (вверх/вниз)
-                self.selected_letter.position[2] += step
-            # После перемещения обновляем трансформированные вершины
-            self.selected_letter.update_geometry()
-            self.update()
-
-    def reflect_selected(self, axis):
-        """Отражает выбранную букву по указанной оси"""
-        if self.selected_letter:
-            self.selected_letter.reflect(axis)
-            self.update()
-
-    def rotate_selected(self, axis, direction):
-        """Вращает выбранную букву вокруг указанной оси"""
-        if self.selected_letter:
-            self.selected_letter.rotate(axis, direction * self.rotation_step)
-            self.update()
-
-    def scale_selected(self, axis, direction):
-        if self.selected_letter:
-            factor = self.scale_step if direction > 0 else 1 / self.scale_step
-            self.selected_letter.scale_object(axis, factor)
-            self.update()
-
-    def set_rotation_step(self, value):
-        self.rotation_step = value
-
-    def set_uniform_scale(self, scale):
-        if self.selected_letter:
-            self.selected_letter.set_uniform_scale(scale)
-            self.update()
-
-    def set_render_mode(self, mode):
-        """Устанавливает режим отображения"""
-        self.render_mode = mode
-        self.update()
-    
-    def toggle_faces(self, show):
-        """Включает/выключает отображение заливки граней"""
-        print(f"ViewerWidget: toggling faces to {show}")
-        self.show_faces = show
-        self.update()
-    
-    def toggle_edges(self, show):
-        """Включает/выключает отображение рёбер"""
-        print(f"ViewerWidget: toggling edges to {show}")
-        self.show_edges = show
-        self.update()
-    
-    def set_fill_opacity(self, opacity):
-        """Устанавливает непрозрачность заливки"""
-        self.fill_opacity = opacity
-        self.update()
-    
-    def set_edge_thickness(self, thickness):
-        """Устанавливает толщину рёбер"""
-        self.edge_thickness = thickness
-        self.update()
-
-class MainWindow(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("3D Viewer")
-        self.setGeometry(100, 100, 1200, 800)
-        
-        # Создаем главный виджет и layout
-        main_widget = QWidget()
-        self.setCentralWidget(main_widget)
-        main_layout = QHBoxLayout(main_widget)
-        
-        # Создаем область для 3D просмотра
-        self.viewer = ViewerWidget()
-        main_layout.addWidget(self.viewer, stretch=2)
-        
-        # Создаем панель управления
-        control_panel = QWidget()
-        control_layout = QVBoxLayout(control_panel)
-        main_layout.addWidget(control_panel, stretch=1)
-        
-        # Выбор активной буквы
-        letter_selector_group = QGroupBox("Выбор буквы")
-        letter_selector_layout = QVBoxLayout(letter_selector_group)
-        self.letter_combo = QComboBox()
-        self.letter_combo.addItems(["Буква С", "Буква Д"])
-        self.letter_combo.currentIndexChanged.connect(self.change_selected_letter)
-        letter_selector_layout.addWidget(self.letter_combo)
-        control_layout.addWidget(letter_selector_group)
-        
-        # Группа параметров букв
-        self.letter_params_group = QGroupBox("Параметры букв")
-        letter_params_layout = QVBoxLayout(self.letter_params_group)
-        
-        # Параметры для буквы С
-        self.c_params_widget = QWidget()
-        c_params_layout = QVBoxLayout(self.c_params_widget)
-        c_params_layout.setContentsMargins(0, 0, 0, 0)
-        
-        # Высота для С
-        c_height_layout = QHBoxLayout()
-        c_height_layout.addWidget(QLabel("Высота:"))
-        self.c_height_spin = QDoubleSpinBox()
-        self.c_height_spin.setRange(0.1, 20.0)
-        self.c_height_spin.setValue(4.0)
-        self.c_height_spin.valueChanged.connect(lambda: self.update_letter_params("С"))
-        c_height_layout.addWidget(self.c_height_spin)
-        c_params_layout.addLayout(c_height_layout)
-        
-        # Ширина для С
-        c_width_layout = QHBoxLayout()
-        c_width_layout.addWidget(QLabel("Ширина:"))
-        self.c_width_spin = QDoubleSpinBox()
-        self.c_width_spin.setRange(0.1, 20.0)
-        self.c_width_spin.setValue(2.0)
-        self.c_width_spin.valueChanged.connect(lambda: self.update_letter_params("С"))
-        c_width_layout.addWidget(self.c_width_spin)
-        c_params_layout.addLayout(c_width_layout)
-        
-        # Глубина для С
-        c_depth_layout = QHBoxLayout()
-        c_depth_layout.addWidget(QLabel("Глубина:"))
-        self.c_depth_spin = QDoubleSpinBox()
-        self.c_depth_spin.setRange(0.1, 20.0)
-        self.c_depth_spin.setValue(1.0)
-        self.c_depth_spin.valueChanged.connect(lambda: self.update_letter_params("С"))
-        c_depth_layout.addWidget(self.c_depth_spin)
-        c_params_layout.addLayout(c_depth_layout)
-        
-        # Параметры для буквы Д
-        self.d_params_widget = QWidget()
-        d_params_layout = QVBoxLayout(self.d_params_widget)
-        d_params_layout.setContentsMargins(0, 0, 0, 0)
-        
-        # Высота для Д
-        d_height_layout = QHBoxLayout()
-        d_height_layout.addWidget(QLabel("Высота:"))
-        self.d_height_spin = QDoubleSpinBox()
-        self.d_height_spin.setRange(0.1, 20.0)
-        self.d_height_spin.setValue(4.0)
-        self.d_height_spin.valueChanged.connect(lambda: self.update_letter_params("Д"))
-        d_height_layout.addWidget(self.d_height_spin)
-        d_params_layout.addLayout(d_height_layout)
-        
-        # Ширина для Д
-        d_width_layout = QHBoxLayout()
-        d_width_layout.addWidget(QLabel("Ширина:"))
-        self.d_width_spin = QDoubleSpinBox()
-        self.d_width_spin.setRange(0.1, 20.0)
-        self.d_width_spin.setValue(2.0)
-        self.d_width_spin.valueChanged.connect(lambda: self.update_letter_params("Д"))
-        d_width_layout.addWidget(self.d_width_spin)
-        d_params_layout.addLayout(d_width_layout)
-        
-        # Глубина для Д
-        d_depth_layout = QHBoxLayout()
-        d_depth_layout.addWidget(QLabel("Глубина:"))
-        self.d_depth_spin = QDoubleSpinBox()
-        self.d_depth_spin.setRange(0.1, 20.0)
-        self.d_depth_spin.setValue(1.0)
-        self.d_depth_spin.valueChanged.connect(lambda: self.update_letter_params("Д"))
-        d_depth_layout.addWidget(self.d_depth_spin)
-        d_params_layout.addLayout(d_depth_layout)
-        
-        # Добавляем виджеты параметров в группу
-        letter_params_layout.addWidget(self.c_params_widget)
-        letter_params_layout.addWidget(self.d_params_widget)
-        
-        # По умолчанию показываем параметры для первой буквы
-        self.d_params_widget.hide()
-        
-        control_layout.addWidget(self.letter_params_group)
-
-        # Группа управления перемещением
-        movement_group = QGroupBox("Управление перемещением")
-        movement_layout = QVBoxLayout(movement_group)
-
-        # Шаг перемещения
-        step_layout = QHBoxLayout()
-        step_layout.addWidget(QLabel("Шаг:"))
-        step_spin = QDoubleSpinBox()
-        step_spin.setRange(0.1, 5.0)
-        step_spin.setValue(0.5)
-        step_spin.setSingleStep(0.1)
-        step_spin.valueChanged.connect(self.update_movement_step)
-        step_layout.addWidget(step_spin)
-        movement_layout.addLayout(step_layout)
-
-        # Кнопки перемещения по X
-        x_layout = QHBoxLayout()
-        x_layout.addWidget(QLabel("X (влево/вправо):"))
-        x_minus = QPushButton("-X")
-        x_minus.clicked.connect(lambda: self.viewer.move_selected('x', -1))
-        x_plus = QPushButton("+X")
-        x_plus.clicked.connect(lambda: self.viewer.move_selected('x', 1))
-        x_layout.addWidget(x_minus)
-        x_layout.addWidget(x_plus)
-        movement_layout.addLayout(x_layout)
-
-        # Кнопки перемещения по Y
-        y_layout = QHBoxLayout()
-        y_layout.addWidget(QLabel("Y (вперед/назад):"))
-        y_minus = QPushButton("-Y")
-        y_minus.clicked.connect(lambda: self.viewer.move_selected('y', -1))
-        y_plus = QPushButton("+Y")
-        y_plus.clicked.connect(lambda: self.viewer.move_selected('y', 1))
-        y_layout.addWidget(y_minus)
-        y_layout.addWidget(y_plus)
-        movement_layout.addLayout(y_layout)
-
-        # Кнопки перемещения по Z
-        z_layout = QHBoxLayout()
-        z_layout.addWidget(QLabel("Z (вверх/вниз):"))
-        z_minus = QPushButton("-Z")
-        z_minus.clicked.connect(lambda: self.viewer.move_selected('z', -1))
-        z_plus = QPushButton("+Z")
-        z_plus.clicked.connect(lambda: self.viewer.move_selected('z', 1))
-        z_layout.addWidget(z_minus)
-        z_layout.addWidget(z_plus)
-        movement_layout.addLayout(z_layout)
-
-        # Группа управления вращением
-        rotation_group = QGroupBox("Вращение объекта")
-        rotation_layout = QVBoxLayout(rotation_group)
-
-        # Добавляем спинбокс для шага поворота
-        rotation_step_layout = QHBoxLayout()
-        rotation_step_layout.addWidget(QLabel("Шаг поворота (градусы):"))
-        rotation_step_spin = QSpinBox()
-        rotation_step_spin.setRange(1, 90)
-        rotation_step_spin.setValue(5)
-        rotation_step_spin.valueChanged.connect(self.update_rotation_step)
-        rotation_step_layout.addWidget(rotation_step_spin)
-        rotation_layout.addLayout(rotation_step_layout)
-
-        # Кнопки вращения вокруг X
-        x_rot_layout = QHBoxLayout()
-        x_rot_layout.addWidget(QLabel("Вращение X:"))
-        x_rot_minus = QPushButton("-X")
-        x_rot_minus.clicked.connect(lambda: self.viewer.rotate_selected('x', -1))
-        x_rot_plus = QPushButton("+X")
-        x_rot_plus.clicked.connect(lambda: self.viewer.rotate_selected('x', 1))
-        x_rot_layout.addWidget(x_rot_minus)
-        x_rot_layout.addWidget(x_rot_plus)
-        rotation_layout.addLayout(x_rot_layout)
-
-        # Кнопки вращения вокруг Y
-        y_rot_layout = QHBoxLayout()
-        y_rot_layout.addWidget(QLabel("Вращение Y:"))
-        y_rot_minus = QPushButton("-Y")
-        y_rot_minus.clicked.connect(lambda: self.viewer.rotate_selected('y', -1))
-        y_rot_plus = QPushButton("+Y")
-        y_rot_plus.clicked.connect(lambda: self.viewer.rotate_selected('y', 1))
-        y_rot_layout.addWidget(y_rot_minus)
-        y_rot_layout.addWidget(y_rot_plus)
-        rotation_layout.addLayout(y_rot_layout)
-
-        # Кнопки вращения вокруг Z
-        z_rot_layout = QHBoxLayout()
-        z_rot_layout.addWidget(QLabel("Вращение Z:"))
-        z_rot_minus = QPushButton("-Z")
-        z_rot_minus.clicked.connect(lambda: self.viewer.rotate_selected('z', -1))
-        z_rot_plus = QPushButton("+Z")
-        z_rot_plus.clicked.connect(lambda: self.viewer.rotate_selected('z', 1))
-        z_rot_layout.addWidget(z_rot_minus)
-        z_rot_layout.addWidget(z_rot_plus)
-        rotation_layout.addLayout(z_rot_layout)
-
-        # Группа управления отражением
-        reflection_group = QGroupBox("Отражение")
-        reflection_layout = QVBoxLayout(reflection_group)
-
-        # Кнопки отражения
-        x_reflect = QPushButton("Отражение по X")
-        x_reflect.clicked.connect(lambda: self.viewer.reflect_selected('x'))
-        reflection_layout.addWidget(x_reflect)
-
-        y_reflect = QPushButton("Отражение по Y")
-        y_reflect.clicked.connect(lambda: self.viewer.reflect_selected('y'))
-        reflection_layout.addWidget(y_reflect)
-
-        z_reflect = QPushButton("Отражение по Z")
-        z_reflect.clicked.connect(lambda: self.viewer.reflect_selected('z'))
-        reflection_layout.addWidget(z_reflect)
-
-        # Группа управления масштабом
-        scale_group = QGroupBox("Масштаб")
-        scale_layout = QVBoxLayout(scale_group)
-
-        # Бегунок масштаба
-        scale_layout.addWidget(QLabel("Масштаб:"))
-        scale_spin = QDoubleSpinBox()
-        scale_spin.setRange(0.1, 10.0)
-        scale_spin.setValue(1.0)
-        scale_spin.setSingleStep(0.1)
-        scale_spin.valueChanged.connect(lambda v: self.viewer.set_uniform_scale(v))
-        scale_layout.addWidget(scale_spin)
-        
-        # Группа настройки отображения (Этап 2)
-        render_group = QGroupBox("Настройки отображения (Этап 2)")
-        render_layout = QVBoxLayout(render_group)
-        
-        # Выбор режима отображения
-        render_mode_layout = QHBoxLayout()
-        render_mode_layout.addWidget(QLabel("Режим отображения:"))
-        self.render_mode_combo = QComboBox()
-        self.render_mode_combo.addItems(["Каркас (wireframe)", "Сортировка по глубине (depth-sort)", "Z-буфер (z-buffer)"])
-        self.render_mode_combo.setCurrentIndex(0)  # По умолчанию - каркас
-        self.render_mode_combo.currentIndexChanged.connect(self.change_render_mode)
-        render_mode_layout.addWidget(self.render_mode_combo)
-        render_layout.addLayout(render_mode_layout)
-        
-        # Флажки для отображения граней и рёбер
-        self.show_faces_check = QCheckBox("Показывать грани")
-        self.show_faces_check.setChecked(self.viewer.show_faces)
-        self.show_faces_check.stateChanged.connect(self.toggle_faces)
-        render_layout.addWidget(self.show_faces_check)
-        
-        self.show_edges_check = QCheckBox("Показывать рёбра")
-        self.show_edges_check.setChecked(self.viewer.show_edges)
-        self.show_edges_check.stateChanged.connect(self.toggle_edges)
-        render_layout.addWidget(self.show_edges_check)
-        
-        # Настройка непрозрачности заливки
-        opacity_layout = QHBoxLayout()
-        opacity_layout.addWidget(QLabel("Непрозрачность заливки:"))
-        opacity_spin = QSpinBox()
-        opacity_spin.setRange(0, 255)
-        opacity_spin.setValue(self.viewer.fill_opacity)
-        opacity_spin.valueChanged.connect(self.viewer.set_fill_opacity)
-        opacity_layout.addWidget(opacity_spin)
-        render_layout.addLayout(opacity_layout)
-        
-        # Настройка толщины рёбер
-        edge_thickness_layout = QHBoxLayout()
-        edge_thickness_layout.addWidget(QLabel("Толщина рёбер:"))
-        edge_thickness_spin = QSpinBox()
-        edge_thickness_spin.setRange(1, 5)
-        edge_thickness_spin.setValue(self.viewer.edge_thickness)
-        edge_thickness_spin.valueChanged.connect(self.viewer.set_edge_thickness)
-        edge_thickness_layout.addWidget(edge_thickness_spin)
-        render_layout.addLayout(edge_thickness_layout)
-        
-        # Добавляем все группы в панель управления
-        control_layout.addWidget(movement_group)
-        control_layout.addWidget(rotation_group)
-        control_layout.addWidget(scale_group)
-        control_layout.addWidget(reflection_group)
-        control_layout.addWidget(render_group)  # Добавляем новую группу для Этапа 2
-        
-        # Добавляем подсказки по управлению
-        help_text = QLabel(
-            "Управление:\n"
-            "ЛКМ - вращение камеры\n"
-            "ПКМ - перемещение по X (влево/вправо)\n"
-            "ПКМ + Shift - перемещение по Y (вперед/назад)\n"
-            "ПКМ + Ctrl - перемещение по Z (вверх/вниз)\n"
-            "Колесико - масштаб просмотра"
-        )
-        control_layout.addWidget(help_text)
-        
-        # Добавляем растягивающийся пробел
-        control_layout.addStretch()
-        
-        # Сохраняем ссылки на спинбоксы
-        self.step_spin = step_spin
-        self.rotation_step_spin = rotation_step_spin
-        self.scale_spin = scale_spin
-        self.opacity_spin = opacity_spin
-        self.edge_thickness_spin = edge_thickness_spin
-        
-        # Инициализируем выбор активной буквы
-        self.change_selected_letter(0)
-        # Инициализируем режим отображения
-        self.change_render_mode(0)  # По умолчанию - каркас
-        
-    def change_selected_letter(self, index):
-        # Выбираем букву
-        if index == 0:  # Буква С
-            self.viewer.selected_letter = self.viewer.letters[0]
-            self.c_params_widget.show()
-            self.d_params_widget.hide()
-        else:  # Буква Д
-            self.viewer.selected_letter = self.viewer.letters[1]
-            self.c_params_widget.hide()
-            self.d_params_widget.show()
-        self.viewer.update()
-    
-    def change_render_mode(self, index):
-        # Изменяем режим отображения
-        modes = ["wireframe", "depth-sort", "z-buffer"]
-        self.viewer.set_render_mode(modes[index])
-        # Обновляем UI в зависимости от режима
-        self.update_display_settings_ui(modes[index])
-    
-    def update_display_settings_ui(self, mode):
-        # Обновляем UI в зависимости от режима отображения
-        if mode == "wireframe":
-            # В режиме каркаса грани не отображаются
-            self.show_faces_check.setChecked(False)
-            self.show_faces_check.setEnabled(False)
-            self.opacity_spin.setEnabled(False)
-            
-            # Рёбра всегда включены в режиме каркаса
-            self.show_edges_check.setChecked(True)
-            self.show_edges_check.setEnabled(False)
-            self.edge_thickness_spin.setEnabled(True)
-        else:
-            # В других режимах все настройки доступны
-            self.show_faces_check.setEnabled(True)
-            self.opacity_spin.setEnabled(True)
-            self.show_edges_check.setEnabled(True)
-            self.edge_thickness_spin.setEnabled(True)
-    
-    def toggle_faces(self, state):
-        # Включаем/выключаем отображение граней
-        show = state == Qt.Checked
-        print(f"MainWindow: toggling faces to {show}, state={state}")
-        self.viewer.toggle_faces(show)
-        
-    def toggle_edges(self, state):
-        # Включаем/выключаем отображение рёбер
-        show = state == Qt.Checked
-        print(f"MainWindow: toggling edges to {show}, state={state}")
-        self.viewer.toggle_edges(show)
-
-    def update_letter_params(self, letter):
-        if letter == "С" and self.viewer.letters[0]:
-            self.viewer.letters[0].height = self.c_height_spin.value()
-            self.viewer.letters[0].width = self.c_width_spin.value()
-            self.viewer.letters[0].depth = self.c_depth_spin.value()
-            self.viewer.letters[0].update_geometry()
-        elif letter == "Д" and self.viewer.letters[1]:
-            self.viewer.letters[1].height = self.d_height_spin.value()
-            self.viewer.letters[1].width = self.d_width_spin.value()
-            self.viewer.letters[1].depth = self.d_depth_spin.value()
-            self.viewer.letters[1].update_geometry()
-        self.viewer.update()
-
-    def update_movement_step(self, value):
-        self.viewer.movement_step = value
-
-    def update_rotation_step(self, value):
-        self.viewer.set_rotation_step(value)
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = MainWindow()
-    window.show()
-    sys.exit(app.exec()) 
+    sys.exit(main())